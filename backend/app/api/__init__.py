@@ -2,6 +2,8 @@ from fastapi import APIRouter
 from .update_notion_with_transcript_and_summary import (
     api_router as update_notion_with_transcript_and_summary_router,
 )
+from .metrics import api_router as metrics_router
 
 api_router = APIRouter()
-api_router.include_router(update_notion_with_transcript_and_summary_router, prefix="")
\ No newline at end of file
+api_router.include_router(update_notion_with_transcript_and_summary_router, prefix="")
+api_router.include_router(metrics_router, prefix="")
\ No newline at end of file
@@ -0,0 +1,33 @@
+import asyncio
+import json
+import os
+import re
+from typing import Any, Dict
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.services.tracing import get_timeline_path, metrics
+
+api_router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+# Notion page ids, with or without dashes. Anything else could point outside the timelines directory.
+PAGE_ID_PATTERN = re.compile(r'^[0-9a-fA-F-]+$')
+
+def read_timeline(path: str) -> Dict[str, Any]:
+    with open(path, 'r') as timeline_file:
+        return json.load(timeline_file)
+
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    """Per-stage durations, errors, bytes, tokens and HTTP statuses in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@api_router.get("/timelines/{page_id}")
+async def get_meeting_timeline(page_id: str) -> Dict[str, Any]:
+    """The span timeline of the last time this meeting was processed. Needs MEETING_TIMELINES_ENABLED=true."""
+    if not PAGE_ID_PATTERN.match(page_id):
+        raise HTTPException(status_code=400, detail="Invalid page id")
+    path = get_timeline_path(page_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"No timeline recorded for {page_id}")
+    return await asyncio.to_thread(read_timeline, path)
@@ -1,23 +1,47 @@
 import logging
-from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException
 import traceback
-from io import BytesIO
 from contextlib import asynccontextmanager
 from app.services.transcribe import transcribe
 from app.services.summarize import decomposed_summarize_transcription_and_upload_to_notion  
+from app.services.jumpshare import (
+    create_spool_file,
+    download_jumpshare_video_to_spool_file,
+    get_jumpshare_video_fingerprint,
+    tee_jumpshare_video_to_spool_file
+)
+from app.services.transcription_cache import get_cached_transcription, get_source_cache_key
+from app.lib.Env import audio_pipeline_mode, meeting_concurrency
+from app.lib.Logging import current_meeting_id
 import os
-import httpx
 from app.services.notion import (
     set_summarized_checkbox_on_notion_page_to_true,
+    is_page_summarized,
     upload_transcript_to_notion,
     get_meetings_with_jumpshare_links_and_unsummarized_from_notion,
-    block_tracker, 
+    NotionBlockTracker,
+    current_block_tracker,
+    get_block_tracker,
     rollback_blocks,
-    create_toggle_block
+    create_toggle_block,
+    delete_block
+)
+from app.services.tracing import meeting_timeline, span
+from app.services.job_store import MeetingCheckpoints, MeetingJobStore, meeting_job_store
+from app.services.job_queue import (
+    JOB_QUEUED,
+    MEETING_COMPLETED,
+    MEETING_FAILED,
+    MEETING_RUNNING,
+    MEETING_SKIPPED,
+    job_queue
 )
-from typing import List, Dict
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Dict, Optional
+import asyncio
+import uuid
 from app.models import (
-    Meeting,
+    MeetingRecord,
     Transcription,
     JumpshareLink
 )
@@ -26,80 +50,297 @@ from app.models import (
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
 api_router = APIRouter()
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TOGGLE_STAGES = ["toggle:summary", "toggle:transcript"]
+MEETINGS_WATERMARK_KEY = "meetings_last_edited_watermark"
+# Notion rounds last_edited_time to the minute, so consecutive polls overlap a little to never miss an edit.
+WATERMARK_OVERLAP = timedelta(minutes=2)
+# A meeting that has failed this many times in a row stops holding the watermark back. It is still retried
+# by a full scan, or by any poll after its page is edited again.
+MAX_FAILURES_BEFORE_WATERMARK_SKIPS = 3
+# How often an idle worker checks the queue for jobs added by another process.
+JOB_WORKER_IDLE_SECONDS = 30
+
 @asynccontextmanager
-async def meeting_processing_context(meeting: Meeting):
-    block_tracker.clear()
-    try:
-        yield
-    except Exception as e:
-        logger.error(f"🚨 Error processing meeting {meeting['id']}: {str(e)}")
-        await rollback_blocks()
-        raise
+async def meeting_processing_context(meeting: MeetingRecord, checkpoints: MeetingCheckpoints):
+    # A fresh tracker for this meeting's task. Other meetings running at the same time have their own.
+    tracker_token = current_block_tracker.set(NotionBlockTracker())
+    # Tags every log record from this meeting's tasks, and picks its artifact file in debug mode.
+    meeting_id_token = current_meeting_id.set(meeting.id)
+    with span("meeting"):
+        try:
+            yield
+        except Exception as e:
+            logger.error(f"🚨 Error processing meeting {meeting.id}: {str(e)}")
+            failed_block_ids = await rollback_blocks()
+            # Completed stages stay on the page and in the job store. Toggles that were just rolled back are forgotten.
+            # Toggles that could not be deleted stay recorded, so the next run deletes them before starting over.
+            for stage in TOGGLE_STAGES:
+                toggle = checkpoints.get(stage)
+                if toggle and not toggle['complete'] and toggle['block_id'] not in failed_block_ids:
+                    await checkpoints.delete(stage)
+            raise
+        else:
+            await set_summarized_checkbox_on_notion_page_to_true(meeting.id)
+            await checkpoints.complete()
+        finally:
+            current_block_tracker.reset(tracker_token)
+            current_meeting_id.reset(meeting_id_token)
+
+async def start_toggle_stage(page_id: str, checkpoints: MeetingCheckpoints, title: str, color: str) -> Optional[str]:
+    """
+    Creates the toggle for a Notion upload stage and records it in the job store.
+    Returns None when a previous run already completed the stage.
+    """
+    stage = f"toggle:{title.lower()}"
+    toggle = checkpoints.get(stage)
+    if toggle and toggle['complete']:
+        logger.info(f"💡 {title} was already uploaded to Notion on a previous run. Skipping.")
+        return None
+    if toggle:
+        # A previous run died before it could finish or roll back this toggle. Remove the partial content.
+        await delete_block(toggle['block_id'])
+    toggle_id = await create_toggle_block(page_id, title, color)
+    await checkpoints.save(stage, {"block_id": toggle_id, "complete": False})
+    return toggle_id
+
+async def complete_toggle_stage(checkpoints: MeetingCheckpoints, title: str, toggle_id: str) -> None:
+    await checkpoints.save(f"toggle:{title.lower()}", {"block_id": toggle_id, "complete": True})
+    # A completed stage must survive a later failure, including one in the stage running alongside it.
+    get_block_tracker().forget_tree(toggle_id)
+
+async def transcribe_jumpshare_link(jumpshare_link: JumpshareLink) -> str:
+    fingerprint = await get_jumpshare_video_fingerprint(jumpshare_link)
+    cache_key = get_source_cache_key(jumpshare_link.url, fingerprint) if fingerprint else None
+    if cache_key:
+        cached_transcription = await get_cached_transcription(cache_key)
+        if cached_transcription is not None:
+            logger.info(f"💡 Using cached transcription for {jumpshare_link.url}")
+            return cached_transcription
+
+    if audio_pipeline_mode == "pipe":
+        # Overlap the download with audio extraction. The stream is spooled to disk as a fallback.
+        video_path = create_spool_file()
+        video_stream = tee_jumpshare_video_to_spool_file(jumpshare_link, video_path)
     else:
-        await set_summarized_checkbox_on_notion_page_to_true(meeting['id'])
+        video_path = await get_video_from_jumpshare_link(jumpshare_link)
+        video_stream = None
+    try:
+        return await transcribe(video_path, video_stream, cache_key)
+    finally:
+        os.unlink(video_path)
+        logger.info("Temporary video file cleaned up.")
 
 # @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def process_meeting(meeting: Meeting):
-    async with meeting_processing_context(meeting):
-        page_id: str = meeting['id']
-        jumpshare_video = await get_video_from_jumpshare_link(JumpshareLink(url=meeting['properties']['Jumpshare Link']['url']))
-        transcription: Transcription = await transcribe(jumpshare_video)
-        
-        # Create toggle blocks once
-        summary_toggle_id = await create_toggle_block(page_id, "Summary", "green")
-        transcript_toggle_id = await create_toggle_block(page_id, "Transcript", "orange")
+async def process_meeting(meeting: MeetingRecord, job_store: Optional[MeetingJobStore] = None):
+    page_id: str = meeting.id
+    checkpoints = await MeetingCheckpoints.load(page_id, job_store)
+    # The timeline, when enabled, also collects the spans of the tasks started inside it.
+    async with meeting_timeline(page_id), meeting_processing_context(meeting, checkpoints):
+        transcription: Transcription = checkpoints.get("transcript")
+        if transcription is None:
+            with span("transcribe"):
+                jumpshare_link = JumpshareLink(url=meeting.jumpshare_link)
+                transcription = await transcribe_jumpshare_link(jumpshare_link)
+            await checkpoints.save("transcript", transcription)
         
-        # Pass the created toggle IDs to the respective functions
-        await decomposed_summarize_transcription_and_upload_to_notion(transcription, summary_toggle_id)
-        await upload_transcript_to_notion(transcript_toggle_id, transcription)
+        # Both toggles are created up front so they keep their order on the page. The transcript doesn't depend
+        # on the summary, so the two are then filled concurrently and the meeting takes as long as the slower one.
+        summary_toggle = checkpoints.get("toggle:summary")
+        transcript_toggle = checkpoints.get("toggle:transcript")
+        if transcript_toggle and transcript_toggle['complete'] and not (summary_toggle and summary_toggle['complete']):
+            # Left by a run that kept the transcript without its summary. Redo it, so it goes below the new summary.
+            await checkpoints.save("toggle:transcript", {**transcript_toggle, "complete": False})
+        summary_toggle_id = await start_toggle_stage(page_id, checkpoints, "Summary", "green")
+        transcript_toggle_id = await start_toggle_stage(page_id, checkpoints, "Transcript", "orange")
 
-@api_router.post("/update_notion_with_transcript_and_summary")
-async def update_notion_with_transcript_and_summary() -> Dict[str, str]:
-    logger.info("Received request for updating Notion with transcript and summary.")
+        async def upload_summary() -> None:
+            with span("summary_stage"):
+                await decomposed_summarize_transcription_and_upload_to_notion(transcription, summary_toggle_id, checkpoints)
+            await complete_toggle_stage(checkpoints, "Summary", summary_toggle_id)
+
+        async def upload_transcript() -> None:
+            with span("transcript_stage"):
+                await upload_transcript_to_notion(transcript_toggle_id, transcription)
+
+        stage_tasks = []
+        if summary_toggle_id:
+            stage_tasks.append(asyncio.create_task(upload_summary()))
+        if transcript_toggle_id:
+            stage_tasks.append(asyncio.create_task(upload_transcript()))
+        try:
+            await asyncio.gather(*stage_tasks)
+        except BaseException:
+            # Stop the other stage and wait for it, so nothing is appended after the rollback has run.
+            for stage_task in stage_tasks:
+                stage_task.cancel()
+            await asyncio.gather(*stage_tasks, return_exceptions=True)
+            raise
+        # The transcript usually finishes first, but only the summary can be kept on its own. A retry appends a new
+        # toggle at the end of the page, so a summary recreated below a kept transcript would end up out of order.
+        if transcript_toggle_id:
+            await complete_toggle_stage(checkpoints, "Transcript", transcript_toggle_id)
+
+async def is_meeting_already_summarized(meeting: MeetingRecord, poll_started_at: Optional[datetime]) -> bool:
+    """
+    Whether another worker finished the meeting between our listing it and taking its lock.
+    The lock is released once a meeting is done, so holding it alone doesn't rule that out.
+    """
+    if poll_started_at is not None:
+        completed_at = await asyncio.to_thread(meeting_job_store.get_completed_at, meeting.id)
+        if completed_at is not None and completed_at >= poll_started_at.timestamp():
+            return True
+    return await is_page_summarized(meeting.id)
+
+async def process_meeting_with_page_lock(
+    meeting: MeetingRecord,
+    lock_owner: str,
+    job_id: Optional[str] = None,
+    poll_started_at: Optional[datetime] = None
+) -> bool:
+    """
+    Processes a meeting while holding its page lock, recording its progress on the job when there is one.
+    Returns whether the meeting was summarized. Meetings locked by another job or process are skipped,
+    and so are meetings that turn out to have been summarized since they were listed.
+    """
+    async def set_status(status: str, error: Optional[str] = None) -> None:
+        if job_id:
+            await asyncio.to_thread(job_queue.set_meeting_status, job_id, meeting.id, status, error)
+
+    if not await asyncio.to_thread(job_queue.acquire_page_lock, meeting.id, lock_owner):
+        logger.info(f"💡 Meeting {meeting.id} is already being processed elsewhere. Skipping.")
+        await set_status(MEETING_SKIPPED)
+        return False
     try:
-        meetings_to_summarize: List[Meeting] = await get_meetings_with_jumpshare_links_and_unsummarized_from_notion()
-        logger.info(f"💡 Found {len(meetings_to_summarize)} meetings to summarize.")
+        if await is_meeting_already_summarized(meeting, poll_started_at):
+            logger.info(f"💡 Meeting {meeting.id} was summarized since it was listed. Skipping.")
+            await set_status(MEETING_SKIPPED)
+            return True
+        await set_status(MEETING_RUNNING)
+        await process_meeting(meeting)
+        logger.info(f"✅ Successfully processed meeting {meeting.id}")
+        await set_status(MEETING_COMPLETED)
+        return True
+    # except RetryError as e:
+    #     logger.error(f"🚨 Failed to process meeting {meeting.id} after all retry attempts: {str(e)}")
+    except Exception as e:
+        logger.error(f"🚨 Unexpected error processing meeting {meeting.id}: {str(e)}")
+        await asyncio.to_thread(meeting_job_store.record_failure, meeting.id, str(e))
+        await set_status(MEETING_FAILED, str(e))
+        return False
+    finally:
+        await asyncio.to_thread(job_queue.release_page_lock, meeting.id, lock_owner)
+
+async def poll_and_process_meetings(full_scan: bool = False, job_id: Optional[str] = None) -> Dict[str, int]:
+    """
+    Finds the meetings that still need a summary and processes them.
+
+    :param full_scan: Ignore the watermark and look at every unsummarized meeting, not just recently edited ones.
+    :param job_id: The queued job this poll runs for, if any. Per-meeting progress is recorded on it.
+    """
+    poll_started_at = datetime.now(timezone.utc)
+    lock_owner = job_id or f"process:{uuid.uuid4().hex}"
+    edited_since = None if full_scan else await asyncio.to_thread(meeting_job_store.get_state, MEETINGS_WATERMARK_KEY)
+    # Collect the compact records before processing. Checking Summarized changes the query's result set,
+    # which would make the remaining pagination cursors unreliable.
+    meetings_to_summarize: List[MeetingRecord] = await get_meetings_with_jumpshare_links_and_unsummarized_from_notion(edited_since)
+    logger.info(f"💡 Found {len(meetings_to_summarize)} meetings to summarize" + (f" edited since {edited_since}." if edited_since else "."))
+
+    # Meetings run concurrently, each in its own task. Downloads, ffmpeg, Whisper, the LLM and Notion
+    # are limited per stage across all of them, see app/services/stage_limits.py.
+    semaphore = asyncio.Semaphore(meeting_concurrency)
+
+    async def process_meeting_with_limit(meeting: MeetingRecord) -> bool:
+        async with semaphore:
+            return await process_meeting_with_page_lock(meeting, lock_owner, job_id, poll_started_at)
+
+    results = await asyncio.gather(*(process_meeting_with_limit(meeting) for meeting in meetings_to_summarize))
+    failed_meeting_ids = [meeting.id for meeting, succeeded in zip(meetings_to_summarize, results) if not succeeded]
+
+    # Only move the watermark once every meeting up to now went through, so failed ones are picked up again.
+    # Meetings that keep failing, e.g. on a broken Jumpshare link, are left behind so they can't freeze it.
+    failure_counts = await asyncio.to_thread(meeting_job_store.get_failure_counts, failed_meeting_ids) if failed_meeting_ids else {}
+    given_up_meeting_ids = [
+        page_id for page_id in failed_meeting_ids if failure_counts.get(page_id, 0) >= MAX_FAILURES_BEFORE_WATERMARK_SKIPS
+    ]
+    if given_up_meeting_ids:
+        logger.warning(
+            f"⚠️ Moving the watermark past {len(given_up_meeting_ids)} meetings that failed {MAX_FAILURES_BEFORE_WATERMARK_SKIPS} "
+            f"or more times in a row: {given_up_meeting_ids}. A full scan or an edit to the page retries them."
+        )
+    if len(given_up_meeting_ids) == len(failed_meeting_ids):
+        watermark = (poll_started_at - WATERMARK_OVERLAP).isoformat()
+        await asyncio.to_thread(meeting_job_store.set_state, MEETINGS_WATERMARK_KEY, watermark)
+    else:
+        logger.info(f"💡 Keeping the watermark at {edited_since} until {len(failed_meeting_ids) - len(given_up_meeting_ids)} failed meetings go through.")
+
+    return {"meetings_found": len(meetings_to_summarize), "meetings_failed": len(failed_meeting_ids)}
 
-        for meeting in meetings_to_summarize:
+async def run_job_worker() -> None:
+    """
+    Runs queued jobs one at a time, for as long as the app is up. Meetings within a job run concurrently.
+    Also wakes up periodically, to pick up jobs queued by another process sharing the queue.
+    """
+    requeued_jobs = await asyncio.to_thread(job_queue.requeue_interrupted_jobs)
+    if requeued_jobs:
+        logger.info(f"💡 Requeued {requeued_jobs} jobs interrupted by the last shutdown.")
+    job_available = job_queue.get_job_available_event()
+
+    while True:
+        job = await asyncio.to_thread(job_queue.claim_next)
+        if job is None:
+            job_available.clear()
             try:
-                await process_meeting(meeting)
-                logger.info(f"✅ Successfully processed meeting {meeting['id']}")
-            # except RetryError as e:
-            #     logger.error(f"🚨 Failed to process meeting {meeting['id']} after all retry attempts: {str(e)}")
-            except Exception as e:
-                logger.error(f"🚨 Unexpected error processing meeting {meeting['id']}: {str(e)}")
-
-        return {"message": "Processing completed"}
-    
+                await asyncio.wait_for(job_available.wait(), timeout=JOB_WORKER_IDLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        logger.info(f"💡 Starting job {job['id']}" + (" (full scan)." if job['full_scan'] else "."))
+        try:
+            result = await poll_and_process_meetings(job['full_scan'], job['id'])
+            await asyncio.to_thread(job_queue.finish, job['id'])
+            logger.info(f"✅ Job {job['id']} finished: {result}")
+        except asyncio.CancelledError:
+            # The app is shutting down. The job is requeued on the next startup.
+            raise
+        except Exception as e:
+            logger.error(f"🚨 Job {job['id']} failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            await asyncio.to_thread(job_queue.finish, job['id'], str(e))
+
+@api_router.post("/update_notion_with_transcript_and_summary", status_code=202)
+async def update_notion_with_transcript_and_summary(full_scan: bool = False) -> Dict[str, Any]:
+    """
+    Queues a poll of the meetings database and returns right away. Follow it with GET /jobs/{job_id}.
+    A trigger that arrives while a poll is still waiting to start is coalesced into that poll.
+    """
+    logger.info("Received request for updating Notion with transcript and summary.")
+    try:
+        job_id, coalesced = await asyncio.to_thread(job_queue.enqueue, full_scan)
+        job_queue.get_job_available_event().set()
+        logger.info(f"💡 {'Coalesced request into' if coalesced else 'Queued'} job {job_id}.")
+        return {"job_id": job_id, "status": JOB_QUEUED, "coalesced": coalesced}
     except Exception as e:
         logger.error(f"🚨 Error in update_notion_with_transcript_and_summary: {str(e)}")
         logger.error(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error updating Notion with transcript and summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error queueing Notion update: {str(e)}")
+
+@api_router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str) -> Dict[str, Any]:
+    job = await asyncio.to_thread(job_queue.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
     
 # @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def get_video_from_jumpshare_link(jumpshare_link: JumpshareLink) -> UploadFile:
+async def get_video_from_jumpshare_link(jumpshare_link: JumpshareLink) -> str:
     logger.info(f"💡 Getting file from Jumpshare link: {jumpshare_link.url}")
     try:
-        modified_link = jumpshare_link.url + "+"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:91.0) Gecko/20100101 Firefox/91.0"
-        }
-        async with httpx.AsyncClient() as client:
-            response = await client.get(modified_link, headers=headers, follow_redirects=True)
-            final_url = response.url
-            video_response = await client.get(final_url, headers=headers)
-
-            if video_response.status_code == 200:
-                video_content = BytesIO(video_response.content)
-                video_content.seek(0)
-                jumpshare_video = UploadFile(file=video_content, filename="video.mp4")
-                return jumpshare_video
-            else:
-                logger.error(f"🚨 Failed to download video. Status code: {video_response.status_code}")
-                raise HTTPException(status_code=video_response.status_code, detail="Failed to download video")
+        return await download_jumpshare_video_to_spool_file(jumpshare_link)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"🚨 Error processing Jumpshare link: {str(e)}")
         logger.error(traceback.format_exc())
@@ -8,3 +8,53 @@ open_ai_api_key = os.getenv("OPENAI_API_KEY")
 notion_api_key = os.getenv("NOTION_API_KEY")
 rainsound_meetings_database_id= os.getenv("RAINSOUND_MEETINGS_DATABASE_ID")
 
+
+# "pipe" streams the Jumpshare download straight into ffmpeg, "spool" downloads the whole file first.
+audio_pipeline_mode = os.getenv("AUDIO_PIPELINE_MODE", "pipe")
+# Length of each audio segment sent to Whisper.
+audio_segment_seconds = int(os.getenv("AUDIO_SEGMENT_SECONDS", "600"))
+# Local state (caches, job store) lives here. Defaults to backend/storage.
+storage_dir = os.getenv("STORAGE_DIR")
+transcription_cache_max_bytes = int(os.getenv("TRANSCRIPTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# See AUDIO_EXTRACTION_PROFILES in app/services/transcribe.py.
+audio_extraction_profile = os.getenv("AUDIO_EXTRACTION_PROFILE", "speech_mp3")
+audio_trim_silence = os.getenv("AUDIO_TRIM_SILENCE", "false").lower() == "true"
+# Maximum number of chat completion requests in flight at once across the whole process.
+openai_concurrency = int(os.getenv("OPENAI_CONCURRENCY", "8"))
+# How many summary sections are generated and evaluated at the same time.
+summary_section_concurrency = int(os.getenv("SUMMARY_SECTION_CONCURRENCY", "3"))
+# Candidates generated in parallel per summary section before falling back to feedback-driven retries.
+# Off (1) by default: each extra candidate is another generation and evaluation call for every section.
+summary_candidate_count = int(os.getenv("SUMMARY_CANDIDATE_COUNT", "1"))
+# Transcripts whose prompt would exceed this many tokens are summarized with map-reduce over overlapping windows.
+summary_single_pass_token_limit = int(os.getenv("SUMMARY_SINGLE_PASS_TOKEN_LIMIT", "60000"))
+summary_window_tokens = int(os.getenv("SUMMARY_WINDOW_TOKENS", "12000"))
+summary_window_overlap_tokens = int(os.getenv("SUMMARY_WINDOW_OVERLAP_TOKENS", "400"))
+evaluation_cache_max_bytes = int(os.getenv("EVALUATION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Notion allows an average of three requests per second per integration.
+notion_requests_per_second = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+# How many meetings are processed at once. Each stage below is limited process-wide, across all meetings.
+meeting_concurrency = int(os.getenv("MEETING_CONCURRENCY", "3"))
+download_concurrency = int(os.getenv("DOWNLOAD_CONCURRENCY", "3"))
+# Audio extraction is CPU bound, so by default there is one ffmpeg process per core.
+ffmpeg_concurrency = int(os.getenv("FFMPEG_CONCURRENCY", str(os.cpu_count() or 1)))
+whisper_concurrency = int(os.getenv("WHISPER_CONCURRENCY", "4"))
+notion_concurrency = int(os.getenv("NOTION_CONCURRENCY", "3"))
+# The in-process poller queues a poll every MEETING_POLL_MIN_SECONDS while new meetings keep arriving,
+# and backs off towards MEETING_POLL_MAX_SECONDS while the database is quiet.
+meeting_poll_enabled = os.getenv("MEETING_POLL_ENABLED", "true").lower() == "true"
+meeting_poll_min_seconds = float(os.getenv("MEETING_POLL_MIN_SECONDS", "60"))
+meeting_poll_max_seconds = float(os.getenv("MEETING_POLL_MAX_SECONDS", "900"))
+# Stage spans feed the /metrics endpoint. Timelines additionally write every span of a meeting to storage/timelines.
+tracing_enabled = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+meeting_timelines_enabled = os.getenv("MEETING_TIMELINES_ENABLED", "false").lower() == "true"
+# Logs are written as JSON lines by a background thread, see app/lib/Logging.py. LOG_FILE defaults to app.log
+# in the storage directory. A relative path is relative to backend, and an empty value logs to stderr only.
+log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+log_file = os.getenv("LOG_FILE")
+log_file_max_bytes = int(os.getenv("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+log_file_backup_count = int(os.getenv("LOG_FILE_BACKUP_COUNT", "3"))
+# Prompts, responses and other large payloads are cut to this many characters in log records.
+log_payload_max_chars = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "500"))
+# Debugging only: writes every full prompt and response to storage/log_artifacts/<meeting id>.log.
+log_full_payloads = os.getenv("LOG_FULL_PAYLOADS", "false").lower() == "true"
@@ -0,0 +1,217 @@
+import atexit
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Optional
+from app.lib.Env import (
+    log_level,
+    log_file,
+    log_file_max_bytes,
+    log_file_backup_count,
+    log_payload_max_chars,
+    log_full_payloads
+)
+from app.lib.Storage import BASE_DIR, STORAGE_DIR
+
+# Records waiting for the writer thread. When it falls this far behind, new records are dropped instead of waiting.
+LOG_QUEUE_SIZE = 10000
+# A backstop for messages that still interpolate a whole prompt or response.
+MAX_MESSAGE_CHARS = 4000
+ARTIFACT_DIR = os.path.join(STORAGE_DIR, "log_artifacts")
+ARTIFACT_FILE_MAX_BYTES = 5 * 1024 * 1024
+ARTIFACT_FILE_BACKUP_COUNT = 2
+MAX_OPEN_ARTIFACT_FILES = 16
+ARTIFACT_LOGGER_NAME = "app.artifacts"
+# Attributes every LogRecord has. Anything else was passed with `extra=` and becomes a field of the JSON record.
+STANDARD_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+current_meeting_id: ContextVar[Optional[str]] = ContextVar("current_meeting_id", default=None)
+artifact_logger = logging.getLogger(ARTIFACT_LOGGER_NAME)
+
+def get_log_file_path() -> Optional[str]:
+    # Kept out of the source tree by default, so logging never dirties a checkout.
+    if log_file is None:
+        return os.path.join(STORAGE_DIR, "app.log")
+    return os.path.join(BASE_DIR, log_file) if log_file else None
+
+def truncate_payload(payload: str, max_chars: int = log_payload_max_chars) -> str:
+    """
+    Cuts a prompt, response or other large payload down for a log record. The length and hash are kept,
+    so identical payloads can still be told apart.
+    """
+    if len(payload) <= max_chars:
+        return payload
+    digest = hashlib.sha256(payload.encode("utf-8", errors="replace")).hexdigest()[:12]
+    return f"{payload[:max_chars]}… [{len(payload)} chars, sha256:{digest}]"
+
+def log_payload_artifact(kind: str, payload: str, **fields: Any) -> None:
+    """
+    Queues the full payload for the current meeting's artifact file at storage/log_artifacts/<meeting id>.log.
+    Does nothing unless LOG_FULL_PAYLOADS is set.
+    """
+    if log_full_payloads:
+        artifact_logger.debug(payload, extra={"kind": kind, **fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any `extra=` fields alongside the message."""
+
+    def __init__(self, max_message_chars: Optional[int] = MAX_MESSAGE_CHARS):
+        super().__init__()
+        self.max_message_chars = max_message_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if self.max_message_chars is not None:
+            message = truncate_payload(message, self.max_message_chars)
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread without ever waiting on it. Only the message is merged here,
+    everything else, including the JSON encoding and the I/O, happens on the writer thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped_records = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # The traceback has to be rendered now, while its frames are still what they were.
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        meeting_id = current_meeting_id.get()
+        if meeting_id is not None and not hasattr(record, "meeting_id"):
+            record.meeting_id = meeting_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.dropped_records:
+            record.dropped_records = self.dropped_records
+        try:
+            self.queue.put_nowait(record)
+            self.dropped_records = 0
+        except queue.Full:
+            self.dropped_records += 1
+
+
+class LogListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room at shutdown, so the records still queued are written rather than lost.
+        self.queue.put(self._sentinel)
+
+
+class MeetingArtifactHandler(logging.Handler):
+    """Writes each record to a size-capped rotating file per meeting. Runs on the writer thread."""
+
+    def __init__(self):
+        super().__init__()
+        self.file_handlers: "OrderedDict[str, RotatingFileHandler]" = OrderedDict()
+
+    def get_file_handler(self, meeting_id: str) -> RotatingFileHandler:
+        file_handler = self.file_handlers.pop(meeting_id, None)
+        if file_handler is None:
+            if len(self.file_handlers) >= MAX_OPEN_ARTIFACT_FILES:
+                _, oldest_file_handler = self.file_handlers.popitem(last=False)
+                oldest_file_handler.close()
+            os.makedirs(ARTIFACT_DIR, exist_ok=True)
+            file_handler = RotatingFileHandler(
+                os.path.join(ARTIFACT_DIR, f"{meeting_id}.log"),
+                maxBytes=ARTIFACT_FILE_MAX_BYTES,
+                backupCount=ARTIFACT_FILE_BACKUP_COUNT,
+                encoding="utf-8"
+            )
+            file_handler.setFormatter(JsonFormatter(max_message_chars=None))
+        self.file_handlers[meeting_id] = file_handler
+        return file_handler
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.get_file_handler(getattr(record, "meeting_id", None) or "no_meeting").handle(record)
+
+    def close(self) -> None:
+        for file_handler in self.file_handlers.values():
+            file_handler.close()
+        self.file_handlers.clear()
+        super().close()
+
+
+_listener: Optional[LogListener] = None
+
+def is_not_artifact(record: logging.LogRecord) -> bool:
+    return record.name != ARTIFACT_LOGGER_NAME
+
+def configure_logging() -> None:
+    """
+    Routes every log record through a bounded queue to a background thread, which writes it as JSON to stderr
+    and to a rotating LOG_FILE. Logging from the event loop never waits on I/O. Calling it again does nothing.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handlers = [logging.StreamHandler()]
+    log_file_path = get_log_file_path()
+    if log_file_path:
+        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+        handlers.append(RotatingFileHandler(
+            log_file_path,
+            maxBytes=log_file_max_bytes,
+            backupCount=log_file_backup_count,
+            encoding="utf-8"
+        ))
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(is_not_artifact)
+    if log_full_payloads:
+        artifact_handler = MeetingArtifactHandler()
+        artifact_handler.addFilter(logging.Filter(ARTIFACT_LOGGER_NAME))
+        handlers.append(artifact_handler)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(log_level)
+    # Artifacts are written at any log level, but only to their own files.
+    artifact_logger.addHandler(queue_handler)
+    artifact_logger.setLevel(logging.DEBUG)
+    artifact_logger.propagate = False
+
+    _listener = LogListener(queue_handler.queue, *handlers)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Writes out the records still queued and closes the log files."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -0,0 +1,88 @@
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from app.lib.Env import storage_dir
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
+STORAGE_DIR = storage_dir or os.path.join(BASE_DIR, 'storage')
+
+
+@contextmanager
+def open_sqlite(file_name: str) -> Iterator[sqlite3.Connection]:
+    """
+    Opens a SQLite database in the storage directory. The transaction is committed when the block exits
+    cleanly, rolled back otherwise, and the connection is always closed.
+    """
+    os.makedirs(STORAGE_DIR, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(STORAGE_DIR, file_name), timeout=30)
+    try:
+        # WAL lets readers keep going while a writer commits, which matters once several meetings share a store.
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+class SqliteLruCache:
+    """
+    On-disk text cache. Entries are evicted least recently used first once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, file_name: str, max_bytes: int):
+        self.file_name = file_name
+        self.max_bytes = max_bytes
+        self.initialized = False
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with open_sqlite(self.file_name) as connection:
+            if not self.initialized:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS cache_entries (
+                        key TEXT PRIMARY KEY,
+                        content TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                    """
+                )
+                connection.execute("CREATE INDEX IF NOT EXISTS cache_entries_last_used ON cache_entries (last_used)")
+                self.initialized = True
+            yield connection
+
+    def get(self, key: str) -> Optional[str]:
+        with self.connect() as connection:
+            row = connection.execute("SELECT content FROM cache_entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE cache_entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, content: str) -> None:
+        size = len(content.encode())
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, content, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, size, time.time())
+            )
+            self.evict(connection)
+
+    def evict(self, connection: sqlite3.Connection) -> None:
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in connection.execute("SELECT key, size FROM cache_entries ORDER BY last_used").fetchall():
+            if total_size <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            total_size -= size
+            evicted += 1
+        logger.info(f"💡 Evicted {evicted} entries from {self.file_name}.")
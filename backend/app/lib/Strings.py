@@ -1,2 +1,32 @@
+from typing import List
+
+
 def uncapitalize(string: str) -> str:
     return string[0].lower() + string[1:]
+
+def utf16_length(string: str) -> int:
+    """Length as Notion counts it, in UTF-16 code units. Characters outside the BMP, like most emoji, count twice."""
+    if string.isascii():
+        return len(string)
+    return len(string.encode("utf-16-le")) // 2
+
+def fit_utf16(string: str, start: int, limit: int) -> int:
+    """
+    Returns an end such that string[start:end] is at most `limit` UTF-16 code units,
+    at most one character short of the longest slice that fits.
+    """
+    end = min(start + limit, len(string))
+    # Every character is one or two code units, so dropping half the excess each round converges quickly.
+    while (excess := utf16_length(string[start:end]) - limit) > 0:
+        end -= (excess + 1) // 2
+    return end
+
+def split_utf16(string: str, limit: int) -> List[str]:
+    """Splits a string into pieces of at most `limit` UTF-16 code units, never inside a surrogate pair."""
+    pieces = []
+    start = 0
+    while start < len(string):
+        end = fit_utf16(string, start, limit)
+        pieces.append(string[start:end])
+        start = end
+    return pieces
@@ -6,10 +6,28 @@ class StandardModelConfig:
     orm_mode = True
     allow_population_by_field_name = True
 
-class Meeting(BaseModel):
-    id: str
-    properties: Dict[str, Dict[str, Dict[str, List[Dict[str, Dict[str, str]]]]]]
-    jumpshare_link: Optional[str]
+class MeetingRecord:
+    """The few fields of a Notion meeting page the pipeline reads, instead of the page's full nested dict."""
+    __slots__ = ("id", "jumpshare_link", "summarized", "last_edited_time")
+
+    def __init__(self, id: str, jumpshare_link: Optional[str], summarized: bool, last_edited_time: Optional[str]):
+        self.id = id
+        self.jumpshare_link = jumpshare_link
+        self.summarized = summarized
+        self.last_edited_time = last_edited_time
+
+    @classmethod
+    def from_notion_page(cls, page: Dict) -> "MeetingRecord":
+        properties = page.get("properties", {})
+        return cls(
+            id=page["id"],
+            jumpshare_link=(properties.get("Jumpshare Link") or {}).get("url"),
+            summarized=(properties.get("Summarized") or {}).get("checkbox", False),
+            last_edited_time=page.get("last_edited_time")
+        )
+
+    def __repr__(self) -> str:
+        return f"MeetingRecord(id={self.id!r}, jumpshare_link={self.jumpshare_link!r})"
 
 class Transcription(BaseModel):
     content: str
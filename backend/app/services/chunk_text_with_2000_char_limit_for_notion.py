@@ -1,21 +1,44 @@
-def chunk_text_with_2000_char_limit_for_notion(text, max_length=1999):
+from typing import Iterator
+from app.lib.Strings import fit_utf16
+from app.services.parse_markdown_to_notion_blocks import NOTION_MAX_TEXT_LENGTH
+
+SENTENCE_ENDINGS = (". ", "? ", "! ", "\n")
+
+def chunk_text_with_2000_char_limit_for_notion(text: str, max_length: int = NOTION_MAX_TEXT_LENGTH) -> Iterator[str]:
     """
-    Splits the input text into chunks, each with a maximum length of `max_length` characters.
-    
+    Splits the input text into chunks of at most `max_length` UTF-16 code units, which is how Notion
+    measures its limit. Chunks end at the last sentence boundary that fits, else at the last whitespace,
+    and only mid-word when a chunk has neither.
+
+    The text is walked once with index arithmetic, and each chunk is yielded as soon as it is found,
+    so callers can start uploading before a long transcript has been chunked.
+
     :param text: The text to be chunked.
-    :param max_length: The maximum length of each chunk.
-    :return: A list of text chunks.
+    :param max_length: The maximum length of each chunk, in UTF-16 code units.
+    :return: An iterator over the stripped, non-empty chunks.
     """
-    chunks = []
-    while len(text) > max_length:
-        chunk = text[:max_length]
-        last_sentence_end = chunk.rfind('.')
-        if last_sentence_end == -1:
-            last_sentence_end = max_length
-        current_chunk = text[:last_sentence_end + 1].strip()
-        if current_chunk:
-            chunks.append(current_chunk)
-        text = text[last_sentence_end + 1:].strip()
-    if text:
-        chunks.append(text)
-    return chunks
\ No newline at end of file
+    text_length = len(text)
+    is_ascii = text.isascii()
+    start = 0
+    while start < text_length:
+        while start < text_length and text[start].isspace():
+            start += 1
+        if start == text_length:
+            return
+
+        end = min(start + max_length, text_length) if is_ascii else fit_utf16(text, start, max_length)
+        if end < text_length:
+            # Look one character past the window, so a sentence ending right at the limit still counts.
+            search_end = min(end + 1, text_length)
+            sentence_end = max(text.rfind(ending, start, search_end) for ending in SENTENCE_ENDINGS)
+            if sentence_end > start:
+                end = sentence_end + 1
+            else:
+                word_end = max(text.rfind(" ", start, search_end), text.rfind("\t", start, search_end))
+                if word_end > start:
+                    end = word_end
+
+        chunk = text[start:end].rstrip()
+        if chunk:
+            yield chunk
+        start = end
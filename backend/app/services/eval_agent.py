@@ -1,17 +1,31 @@
 import os
-from typing import Optional, Dict, Tuple
-from openai import OpenAI
-from app.lib.Env import open_ai_api_key
+from typing import Iterable, Optional, Dict, Tuple
+from app.services.openai_client import create_chat_completion
+from app.lib.Env import evaluation_cache_max_bytes
+from app.lib.Logging import truncate_payload
+from app.lib.Storage import SqliteLruCache
+from app.services.local_checks import parse_score
+from app.services.tracing import span
+import asyncio
+import hashlib
+import json
 import logging
 import re
 import functools
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=open_ai_api_key)
-
 GOLD_STANDARD_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'gold_standard_evals')
+# The evaluator only needs the passages of the gold standard transcript that its summary draws on, not all 28 KB.
+GOLD_STANDARD_EXCERPT_CHARS = 4000
+GOLD_STANDARD_EXCERPT_WINDOW_WORDS = 40
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i", "in", "is", "it",
+    "its", "of", "on", "or", "so", "that", "the", "their", "there", "this", "to", "was", "we", "were", "with", "you",
+}
+EVALUATION_CACHE_FILE_NAME = "evaluation_cache.sqlite3"
+
+evaluation_cache = SqliteLruCache(EVALUATION_CACHE_FILE_NAME, evaluation_cache_max_bytes)
 
 @functools.lru_cache(maxsize=None)
 def get_gold_standard_file(section_name: str) -> Optional[Tuple[str, str]]:
@@ -40,12 +54,48 @@ def get_gold_standard_file(section_name: str) -> Optional[Tuple[str, str]]:
         return None
 
 
-def evaluate_section(transcript: str, section_summary: str, section_name: str) -> Dict[str, any]:
-    try:
-        gold_standard_data = get_gold_standard_file(section_name)
-        gold_standard_transcript, gold_standard_summary = gold_standard_data or (None, None)
+def get_terms(text: str) -> set:
+    return {word for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS}
+
+def build_gold_standard_excerpt(transcript: str, summary: str) -> str:
+    """
+    Condenses the gold standard transcript to the fixed-size windows that share the most terms with its summary,
+    kept in their original order, up to `GOLD_STANDARD_EXCERPT_CHARS`.
+    """
+    words = transcript.split()
+    windows = [
+        " ".join(words[start:start + GOLD_STANDARD_EXCERPT_WINDOW_WORDS])
+        for start in range(0, len(words), GOLD_STANDARD_EXCERPT_WINDOW_WORDS)
+    ]
+    summary_terms = get_terms(summary)
+    ranked_windows = sorted(range(len(windows)), key=lambda index: len(summary_terms & get_terms(windows[index])), reverse=True)
+
+    selected_windows = []
+    excerpt_length = 0
+    for index in ranked_windows:
+        if excerpt_length + len(windows[index]) > GOLD_STANDARD_EXCERPT_CHARS:
+            break
+        selected_windows.append(index)
+        excerpt_length += len(windows[index])
+    return " … ".join(windows[index] for index in sorted(selected_windows))
+
+@functools.lru_cache(maxsize=None)
+def get_gold_standard_reference(section_name: str) -> Optional[Tuple[str, str]]:
+    gold_standard_data = get_gold_standard_file(section_name)
+    if gold_standard_data is None:
+        return None
+    gold_standard_transcript, gold_standard_summary = gold_standard_data
+    return build_gold_standard_excerpt(gold_standard_transcript, gold_standard_summary), gold_standard_summary
 
-        prompt = f"""
+def prepare_gold_standard_references(section_names: Iterable[str]) -> None:
+    """Builds the condensed gold standard reference for each section up front, so no evaluation pays for it."""
+    for section_name in section_names:
+        get_gold_standard_reference(section_name)
+
+def build_evaluation_prompt(transcript: str, section_summary: str, section_name: str) -> str:
+    gold_standard_excerpt, gold_standard_summary = get_gold_standard_reference(section_name) or (None, None)
+
+    return f"""
         Evaluate the following {section_name} section of a meeting summary:
 
         Actual transcript:
@@ -54,8 +104,8 @@ def evaluate_section(transcript: str, section_summary: str, section_name: str) -
         {section_name} summary to evaluate:
         {section_summary}
 
-        Gold standard transcript:
-        {gold_standard_transcript}
+        Gold standard transcript excerpt (the passages the gold standard summary draws on):
+        {gold_standard_excerpt}
 
         Gold standard {section_name} summary:
         {gold_standard_summary}
@@ -77,26 +127,57 @@ def evaluate_section(transcript: str, section_summary: str, section_name: str) -
         Score: [A single number between 0 and 1, where 1 is the best]
         Feedback: [Your detailed feedback here, including strengths and areas for improvement]
         """
-        
-        response = get_openai_response(prompt)
-        evaluation = parse_evaluation_response(response)
-        
-        logger.info(f"💡 Evaluation for {section_name}: {evaluation}")
-        return evaluation
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def get_evaluation_cache_key(transcript: str, section_summary: str, section_name: str) -> str:
+    # The reference is part of the key, so changing the gold standard files invalidates old scores.
+    reference = json.dumps(get_gold_standard_reference(section_name))
+    return "evaluation:" + "|".join([hash_text(transcript), hash_text(section_summary), section_name, hash_text(reference)[:16]])
+
+async def get_cached_evaluation(key: str) -> Optional[Dict[str, any]]:
+    try:
+        cached_evaluation = await asyncio.to_thread(evaluation_cache.get, key)
+        return json.loads(cached_evaluation) if cached_evaluation is not None else None
+    except Exception as e:
+        logger.warning(f"⚠️ Evaluation cache read failed: {str(e)}")
+        return None
+
+async def cache_evaluation(key: str, evaluation: Dict[str, any]) -> None:
+    try:
+        await asyncio.to_thread(evaluation_cache.put, key, json.dumps(evaluation))
+    except Exception as e:
+        logger.warning(f"⚠️ Evaluation cache write failed: {str(e)}")
+
+async def evaluate_section(transcript: str, section_summary: str, section_name: str) -> Dict[str, any]:
+    try:
+        with span("evaluate", section=section_name) as evaluate_span:
+            cache_key = get_evaluation_cache_key(transcript, section_summary, section_name)
+            cached_evaluation = await get_cached_evaluation(cache_key)
+            if cached_evaluation is not None:
+                evaluate_span.set(cached=True)
+                logger.info(f"💡 Using cached evaluation for {section_name}: {cached_evaluation}")
+                return cached_evaluation
+
+            prompt = build_evaluation_prompt(transcript, section_summary, section_name)
+            response = await get_openai_response(prompt)
+            evaluation = parse_evaluation_response(response)
+            
+            logger.info(f"💡 Evaluation for {section_name}: {evaluation}")
+            # Failed calls come back without a numeric score and must not be memoized.
+            if isinstance(evaluation["score"], float):
+                await cache_evaluation(cache_key, evaluation)
+            return evaluation
     except Exception as e:
         logger.error(f"🚨 Evaluation failed with error: {str(e)}")
         raise
 
-def get_openai_response(prompt: str) -> str:
+async def get_openai_response(prompt: str) -> str:
     try:
-        response = client.chat.completions.create(
-            model="o1-mini",
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        response = await create_chat_completion(prompt)
         content = response.choices[0].message.content
-        logger.info(f"💡 OpenAI API response: {content}")
+        logger.info(f"💡 OpenAI API response: {truncate_payload(content or '')}")
         return content
     except Exception as e:
         logger.error(f"🚨 Error getting OpenAI response: {str(e)}")
@@ -105,8 +186,9 @@ def get_openai_response(prompt: str) -> str:
 def parse_evaluation_response(response: str) -> Dict[str, any]:
     try:
         # Extract score
-        score_match = re.search(r'Score:\s*(0\.\d+|1\.0)', response)
-        score = float(score_match.group(1)) if score_match else "Couldnt find score"
+        score = parse_score(response)
+        if score is None:
+            score = "Couldnt find score"
 
         # Extract feedback (everything after "Feedback:")
         feedback_pattern = f'{re.escape("Feedback:")}(.*)'
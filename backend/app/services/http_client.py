@@ -0,0 +1,21 @@
+import httpx
+from typing import Optional
+
+# One pooled client for every outbound download so connections are reused
+# across meetings instead of paying a fresh TLS handshake per request.
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return _client
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+from app.lib.Storage import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_FILE_NAME = "job_queue.sqlite3"
+# A page lock older than this is assumed to belong to a process that died, and can be taken over.
+PAGE_LOCK_TTL_SECONDS = 3 * 60 * 60
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+MEETING_RUNNING = "running"
+MEETING_COMPLETED = "completed"
+MEETING_FAILED = "failed"
+# Another job or process already holds the page's lock.
+MEETING_SKIPPED = "skipped"
+
+
+class JobQueue:
+    """
+    A persistent queue of meeting polls, plus per-page locks so the same Notion page is never processed
+    by two jobs or processes at once. Each job discovers the pending meetings and processes them.
+
+    Every method is blocking. Call them with asyncio.to_thread from async code.
+    """
+
+    def __init__(self, file_name: str = JOB_QUEUE_FILE_NAME):
+        self.file_name = file_name
+        self.initialized = False
+        # Set whenever a job is enqueued in this process, so the worker picks it up immediately.
+        self.job_available: Optional[asyncio.Event] = None
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with open_sqlite(self.file_name) as connection:
+            if not self.initialized:
+                connection.executescript(
+                    """
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        full_scan INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        finished_at REAL,
+                        error TEXT
+                    );
+                    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+                    CREATE TABLE IF NOT EXISTS job_meetings (
+                        job_id TEXT NOT NULL,
+                        page_id TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        error TEXT,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (job_id, page_id)
+                    );
+                    CREATE TABLE IF NOT EXISTS page_locks (
+                        page_id TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        locked_at REAL NOT NULL
+                    );
+                    """
+                )
+                self.initialized = True
+            yield connection
+
+    def get_job_available_event(self) -> asyncio.Event:
+        if self.job_available is None:
+            self.job_available = asyncio.Event()
+        return self.job_available
+
+    def enqueue(self, full_scan: bool = False) -> Tuple[str, bool]:
+        """
+        Queues a poll, unless one is already waiting to start. Duplicate triggers are coalesced into that one.
+
+        :return: The job id, and whether the request was coalesced into an existing job.
+        """
+        with self.connect() as connection:
+            # Take the write lock up front, so two triggers can't both see an empty queue.
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+            ).fetchone()
+            if row:
+                if full_scan:
+                    connection.execute("UPDATE jobs SET full_scan = 1 WHERE id = ?", (row[0],))
+                return row[0], True
+            job_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO jobs (id, status, full_scan, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, int(full_scan), time.time())
+            )
+            return job_id, False
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT id, full_scan FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (JOB_RUNNING, time.time(), row[0])
+            )
+            return {"id": row[0], "full_scan": bool(row[1])}
+
+    def requeue_interrupted_jobs(self) -> int:
+        """
+        Puts jobs that were running when the process stopped back in the queue and releases their page locks.
+        Meant to be called on startup. The server runs a single worker, so nothing else can own them.
+        """
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            job_ids = [row[0] for row in connection.execute("SELECT id FROM jobs WHERE status = ?", (JOB_RUNNING,))]
+            for job_id in job_ids:
+                connection.execute("DELETE FROM page_locks WHERE owner = ?", (job_id,))
+                connection.execute(
+                    "UPDATE jobs SET status = ?, started_at = NULL WHERE id = ?", (JOB_QUEUED, job_id)
+                )
+            return len(job_ids)
+
+    def has_active_job(self) -> bool:
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1", (JOB_QUEUED, JOB_RUNNING)
+            ).fetchone()
+        return row is not None
+
+    def finish(self, job_id: str, error: Optional[str] = None) -> None:
+        with self.connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (JOB_FAILED if error else JOB_COMPLETED, time.time(), error, job_id)
+            )
+
+    def set_meeting_status(self, job_id: str, page_id: str, status: str, error: Optional[str] = None) -> None:
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO job_meetings (job_id, page_id, status, error, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, page_id, status, error, time.time())
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.connect() as connection:
+            connection.row_factory = sqlite3.Row
+            job = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            meetings = connection.execute(
+                "SELECT page_id, status, error, updated_at FROM job_meetings WHERE job_id = ? ORDER BY updated_at",
+                (job_id,)
+            ).fetchall()
+        progress = {
+            status: sum(1 for meeting in meetings if meeting["status"] == status)
+            for status in (MEETING_RUNNING, MEETING_COMPLETED, MEETING_FAILED, MEETING_SKIPPED)
+        }
+        return {
+            **dict(job),
+            "full_scan": bool(job["full_scan"]),
+            "progress": {"meetings_found": len(meetings), **progress},
+            "meetings": [dict(meeting) for meeting in meetings],
+        }
+
+    def acquire_page_lock(self, page_id: str, owner: str) -> bool:
+        now = time.time()
+        with self.connect() as connection:
+            cursor = connection.execute(
+                """
+                INSERT INTO page_locks (page_id, owner, locked_at) VALUES (?, ?, ?)
+                ON CONFLICT (page_id) DO UPDATE SET owner = excluded.owner, locked_at = excluded.locked_at
+                WHERE page_locks.owner = excluded.owner OR page_locks.locked_at < ?
+                """,
+                (page_id, owner, now, now - PAGE_LOCK_TTL_SECONDS)
+            )
+            return cursor.rowcount == 1
+
+    def release_page_lock(self, page_id: str, owner: str) -> None:
+        with self.connect() as connection:
+            connection.execute("DELETE FROM page_locks WHERE page_id = ? AND owner = ?", (page_id, owner))
+
+
+job_queue = JobQueue()
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from app.lib.Storage import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_FILE_NAME = "meeting_jobs.sqlite3"
+
+
+class MeetingJobStore:
+    """
+    Persists the output of each completed pipeline stage per Notion page, so a failed meeting
+    resumes from its last completed stage instead of starting over.
+    """
+
+    def __init__(self, file_name: str = JOB_STORE_FILE_NAME):
+        self.file_name = file_name
+        self.initialized = False
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with open_sqlite(self.file_name) as connection:
+            if not self.initialized:
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS meeting_checkpoints (
+                        page_id TEXT NOT NULL,
+                        stage TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        updated_at REAL NOT NULL,
+                        PRIMARY KEY (page_id, stage)
+                    )
+                    """
+                )
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS completed_meetings (
+                        page_id TEXT PRIMARY KEY,
+                        completed_at REAL NOT NULL
+                    )
+                    """
+                )
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS meeting_failures (
+                        page_id TEXT PRIMARY KEY,
+                        failures INTEGER NOT NULL,
+                        last_error TEXT,
+                        updated_at REAL NOT NULL
+                    )
+                    """
+                )
+                connection.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS state (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    )
+                    """
+                )
+                self.initialized = True
+            yield connection
+
+    def get_checkpoints(self, page_id: str) -> Dict[str, Any]:
+        with self.connect() as connection:
+            rows = connection.execute(
+                "SELECT stage, value FROM meeting_checkpoints WHERE page_id = ?", (page_id,)
+            ).fetchall()
+        return {stage: json.loads(value) for stage, value in rows}
+
+    def save_checkpoint(self, page_id: str, stage: str, value: Any) -> None:
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO meeting_checkpoints (page_id, stage, value, updated_at) VALUES (?, ?, ?, ?)",
+                (page_id, stage, json.dumps(value), time.time())
+            )
+
+    def delete_checkpoint(self, page_id: str, stage: str) -> None:
+        with self.connect() as connection:
+            connection.execute("DELETE FROM meeting_checkpoints WHERE page_id = ? AND stage = ?", (page_id, stage))
+
+    def complete(self, page_id: str) -> None:
+        """Drops the meeting's checkpoints and failures and records when it was completed, in one transaction."""
+        with self.connect() as connection:
+            connection.execute("DELETE FROM meeting_checkpoints WHERE page_id = ?", (page_id,))
+            connection.execute("DELETE FROM meeting_failures WHERE page_id = ?", (page_id,))
+            connection.execute(
+                "INSERT OR REPLACE INTO completed_meetings (page_id, completed_at) VALUES (?, ?)",
+                (page_id, time.time())
+            )
+
+    def get_completed_at(self, page_id: str) -> Optional[float]:
+        with self.connect() as connection:
+            row = connection.execute("SELECT completed_at FROM completed_meetings WHERE page_id = ?", (page_id,)).fetchone()
+        return row[0] if row else None
+
+    def record_failure(self, page_id: str, error: str) -> int:
+        """Counts a failed attempt at the meeting and returns how many times in a row it has failed."""
+        with self.connect() as connection:
+            connection.execute(
+                """
+                INSERT INTO meeting_failures (page_id, failures, last_error, updated_at) VALUES (?, 1, ?, ?)
+                ON CONFLICT(page_id) DO UPDATE SET
+                    failures = failures + 1, last_error = excluded.last_error, updated_at = excluded.updated_at
+                """,
+                (page_id, error, time.time())
+            )
+            row = connection.execute("SELECT failures FROM meeting_failures WHERE page_id = ?", (page_id,)).fetchone()
+        return row[0]
+
+    def get_failure_counts(self, page_ids: List[str]) -> Dict[str, int]:
+        with self.connect() as connection:
+            rows = connection.execute(
+                f"SELECT page_id, failures FROM meeting_failures WHERE page_id IN ({', '.join('?' * len(page_ids))})",
+                page_ids
+            ).fetchall()
+        return {page_id: failures for page_id, failures in rows}
+
+    def get_state(self, key: str) -> Optional[str]:
+        with self.connect() as connection:
+            row = connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+
+meeting_job_store = MeetingJobStore()
+
+
+class MeetingCheckpoints:
+    """
+    The checkpoints of a single meeting, loaded once and written through to the job store.
+
+    Stages:
+        transcript: the full transcription.
+        condensed_transcript: map-reduce notes for transcripts too long to summarize in one pass.
+        section:<prompt file>: {"summary": str, "score": float} for each summary section.
+        toggle:<name>: {"block_id": str, "complete": bool} for the Summary and Transcript toggles.
+    """
+
+    def __init__(self, page_id: str, job_store: MeetingJobStore, stages: Dict[str, Any]):
+        self.page_id = page_id
+        self.job_store = job_store
+        self.stages = stages
+
+    @classmethod
+    async def load(cls, page_id: str, job_store: Optional[MeetingJobStore] = None) -> "MeetingCheckpoints":
+        job_store = job_store or meeting_job_store
+        stages = await asyncio.to_thread(job_store.get_checkpoints, page_id)
+        if stages:
+            logger.info(f"💡 Resuming meeting {page_id} from checkpoints: {', '.join(sorted(stages))}")
+        return cls(page_id, job_store, stages)
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        return self.stages.get(stage, default)
+
+    async def save(self, stage: str, value: Any) -> None:
+        self.stages[stage] = value
+        await asyncio.to_thread(self.job_store.save_checkpoint, self.page_id, stage, value)
+
+    async def delete(self, stage: str) -> None:
+        self.stages.pop(stage, None)
+        await asyncio.to_thread(self.job_store.delete_checkpoint, self.page_id, stage)
+
+    async def complete(self) -> None:
+        self.stages = {}
+        await asyncio.to_thread(self.job_store.complete, self.page_id)
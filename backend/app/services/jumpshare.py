@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import tempfile
+from typing import AsyncGenerator, Optional
+import aiofiles
+import httpx
+from fastapi import HTTPException
+from app.models import JumpshareLink
+from app.services.http_client import get_http_client
+from app.services.stage_limits import stage_limit
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+JUMPSHARE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:91.0) Gecko/20100101 Firefox/91.0",
+    # Range offsets only line up with what we write to disk for unencoded bodies.
+    "Accept-Encoding": "identity",
+}
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+MAX_DOWNLOAD_RESUMES = 5
+
+def get_total_bytes(response: httpx.Response) -> Optional[int]:
+    content_range = response.headers.get("Content-Range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("Content-Length")
+    return int(content_length) if content_length and content_length.isdigit() else None
+
+async def get_jumpshare_video_fingerprint(jumpshare_link: JumpshareLink) -> Optional[str]:
+    """
+    Identifies the current version of the video behind a link with a HEAD request, preferring the ETag.
+    Returns None when the server gives us nothing to go on.
+    """
+    try:
+        response = await get_http_client().head(jumpshare_link.url + "+", headers=JUMPSHARE_HEADERS, follow_redirects=True)
+        if response.status_code != 200:
+            return None
+        etag = response.headers.get("ETag")
+        if etag:
+            return f"etag:{etag}"
+        last_modified = response.headers.get("Last-Modified")
+        content_length = response.headers.get("Content-Length")
+        if last_modified and content_length:
+            return f"modified:{last_modified}|length:{content_length}"
+        return None
+    except httpx.HTTPError as e:
+        logger.warning(f"⚠️ Could not fingerprint Jumpshare video: {str(e)}")
+        return None
+
+async def iter_jumpshare_video_bytes(jumpshare_link: JumpshareLink) -> AsyncGenerator[bytes, None]:
+    """
+    Streams the video behind a Jumpshare link without ever holding more than one chunk in memory.
+    Dropped connections are resumed with an HTTP Range request from the last byte received.
+    """
+    client = get_http_client()
+    url = jumpshare_link.url + "+"
+    bytes_received = 0
+    total_bytes = None
+    resumes = 0
+
+    # The download slot is held for the whole transfer, resumes included, and so is the span.
+    with span("jumpshare_download") as download_span:
+        async with stage_limit("download"):
+            while True:
+                headers = dict(JUMPSHARE_HEADERS)
+                if bytes_received:
+                    headers["Range"] = f"bytes={bytes_received}-"
+                try:
+                    async with client.stream("GET", url, headers=headers, follow_redirects=True) as response:
+                        # Resume against the resolved file URL rather than going through the redirect again.
+                        url = str(response.url)
+                        if response.status_code not in (200, 206):
+                            logger.error(f"🚨 Failed to download video. Status code: {response.status_code}")
+                            raise HTTPException(status_code=response.status_code, detail="Failed to download video")
+
+                        # A server that ignores Range starts over at byte zero, so skip what we already have.
+                        bytes_to_skip = bytes_received if response.status_code == 200 else 0
+                        if total_bytes is None or response.status_code == 200:
+                            total_bytes = get_total_bytes(response)
+
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            if bytes_to_skip:
+                                if len(chunk) <= bytes_to_skip:
+                                    bytes_to_skip -= len(chunk)
+                                    continue
+                                chunk = chunk[bytes_to_skip:]
+                                bytes_to_skip = 0
+                            bytes_received += len(chunk)
+                            download_span.set(bytes=bytes_received)
+                            yield chunk
+
+                    if total_bytes is None or bytes_received >= total_bytes:
+                        logger.info(f"💡 Downloaded {bytes_received} bytes from Jumpshare.")
+                        return
+                    raise httpx.RemoteProtocolError(
+                        f"Connection closed after {bytes_received} of {total_bytes} bytes"
+                    )
+                except httpx.TransportError as e:
+                    resumes += 1
+                    download_span.set(resumes=resumes)
+                    if resumes > MAX_DOWNLOAD_RESUMES:
+                        logger.error(f"🚨 Giving up on Jumpshare download after {MAX_DOWNLOAD_RESUMES} resumes: {str(e)}")
+                        raise
+                    logger.warning(f"⚠️ Jumpshare download interrupted at {bytes_received} bytes ({str(e)}). Resuming... (Attempt {resumes}/{MAX_DOWNLOAD_RESUMES})")
+                    await asyncio.sleep(min(2 ** resumes, 30))
+
+def create_spool_file() -> str:
+    fd, spool_path = tempfile.mkstemp(suffix=".mp4")
+    os.close(fd)
+    return spool_path
+
+async def tee_jumpshare_video_to_spool_file(jumpshare_link: JumpshareLink, spool_path: str) -> AsyncGenerator[bytes, None]:
+    """
+    Yields the video chunks as they arrive while also writing them to `spool_path`,
+    so the file is still available if the consumer of the stream needs to start over.
+    """
+    async with aiofiles.open(spool_path, "wb") as spool_file:
+        async for chunk in iter_jumpshare_video_bytes(jumpshare_link):
+            await spool_file.write(chunk)
+            yield chunk
+
+async def download_jumpshare_video_to_spool_file(jumpshare_link: JumpshareLink) -> str:
+    """
+    Writes the video to a temporary spool file chunk by chunk and returns its path.
+    The caller owns the file and is responsible for deleting it.
+    """
+    spool_path = create_spool_file()
+    try:
+        async with aiofiles.open(spool_path, "wb") as spool_file:
+            async for chunk in iter_jumpshare_video_bytes(jumpshare_link):
+                await spool_file.write(chunk)
+    except BaseException:
+        os.unlink(spool_path)
+        raise
+    logger.info(f"💡 Video spooled to {spool_path}.")
+    return spool_path
@@ -0,0 +1,128 @@
+import re
+from typing import List, Optional, Set, Tuple
+
+NGRAM_SIZE = 4
+# Whisper and the model rarely agree on every filler word, so a quote passes when most of its n-grams are present.
+QUOTE_NGRAM_MATCH_THRESHOLD = 0.8
+SECTION_LENGTH_BOUNDS = {
+    "Intro": (100, 2000),
+    "Direct Quotes": (20, 2000),
+    "Next Actions": (20, 2000),
+}
+# Headings may come with or without markdown, e.g. "Intro", "## Intro" or "**Intro.**".
+HEADING_MARKUP = "#*_ "
+HEADING_PUNCTUATION = ".: "
+NO_QUOTES_MARKER = "no relevant quotes identified"
+QUOTE_CHARACTERS = '"“”'
+TYPOGRAPHIC_REPLACEMENTS = str.maketrans({"’": "'", "‘": "'", "“": '"', "”": '"'})
+SCORE_PATTERN = re.compile(
+    r'score\W*?[:=]\s*[*\[(]*\s*(?P<value>\d+(?:\.\d+)?|\.\d+)\s*(?P<scale>%|/\s*\d+(?:\.\d+)?)?',
+    re.IGNORECASE
+)
+
+
+def normalize_words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9']+", text.translate(TYPOGRAPHIC_REPLACEMENTS).lower())
+
+
+class TranscriptIndex:
+    """
+    A word n-gram index over a transcript, built once per meeting, so every quote in every candidate
+    can be verified in time linear in the length of the quote.
+    """
+
+    def __init__(self, transcript: str):
+        words = normalize_words(transcript)
+        self.normalized_text = " " + " ".join(words) + " "
+        self.ngrams: Set[Tuple[str, ...]] = {
+            tuple(words[index:index + NGRAM_SIZE]) for index in range(len(words) - NGRAM_SIZE + 1)
+        }
+
+    def contains_quote(self, quote: str) -> bool:
+        words = normalize_words(quote)
+        if not words:
+            return True
+        if len(words) < NGRAM_SIZE:
+            return f" {' '.join(words)} " in self.normalized_text
+        quote_ngrams = [tuple(words[index:index + NGRAM_SIZE]) for index in range(len(words) - NGRAM_SIZE + 1)]
+        matched = sum(1 for ngram in quote_ngrams if ngram in self.ngrams)
+        return matched / len(quote_ngrams) >= QUOTE_NGRAM_MATCH_THRESHOLD
+
+
+def get_first_line(section_summary: str) -> str:
+    return next((line for line in section_summary.split('\n') if line.strip()), "")
+
+def normalize_heading(line: str) -> str:
+    return line.strip().strip(HEADING_MARKUP).rstrip(HEADING_PUNCTUATION).strip(HEADING_MARKUP).lower()
+
+def extract_quotes(section_summary: str, section_name: str) -> List[str]:
+    """
+    Lines in quotation marks, as the prompt asks for. When the model left the quotation marks off,
+    every line under the heading is taken to be a quote instead.
+    """
+    lines = [line.strip().lstrip('-*> ').strip() for line in section_summary.split('\n')]
+    lines = [line for line in lines if line and normalize_heading(line) != section_name.lower()]
+    quoted_lines = [line for line in lines if len(line) > 1 and line[0] in QUOTE_CHARACTERS and line[-1] in QUOTE_CHARACTERS]
+    if quoted_lines:
+        return [line[1:-1].strip() for line in quoted_lines]
+    return lines
+
+def check_section(section_summary: str, section_name: str, transcript_index: Optional[TranscriptIndex] = None) -> Tuple[List[str], List[str]]:
+    """
+    Runs the deterministic checks on a candidate section.
+
+    :return: The rejections and the warnings. A candidate with rejections, i.e. an empty section or a quote
+        that is not in the transcript, is not worth an LLM evaluation. Warnings, like a missing heading or
+        a section that is too long, are fed back to the model and cost the candidate some of its score.
+    """
+    section_summary = (section_summary or "").strip()
+    if not section_summary:
+        return ["The section is empty."], []
+
+    rejections = []
+    warnings = []
+    if normalize_heading(get_first_line(section_summary)) != section_name.lower():
+        warnings.append(f'The section must begin with the heading "{section_name}".')
+
+    minimum_length, maximum_length = SECTION_LENGTH_BOUNDS.get(section_name, (1, 2000))
+    if len(section_summary) < minimum_length:
+        warnings.append(f"The section is only {len(section_summary)} characters long.")
+    elif len(section_summary) > maximum_length:
+        warnings.append(f"The section is {len(section_summary)} characters long, over the {maximum_length} character limit.")
+
+    if section_name == "Direct Quotes" and NO_QUOTES_MARKER not in section_summary.lower():
+        quotes = extract_quotes(section_summary, section_name)
+        if not quotes:
+            warnings.append('No quotes were found. Present each quote on its own line within quotation marks.')
+        elif transcript_index is not None:
+            for quote in quotes:
+                if not transcript_index.contains_quote(quote):
+                    rejections.append(f'This quote does not appear verbatim in the transcript: "{quote}"')
+
+    return rejections, warnings
+
+
+def parse_score(response: str) -> Optional[float]:
+    """
+    Pulls the score out of an evaluator response. Accepts "Score: 0.85", "**Score:** .85", "Score: 8/10",
+    "Score: 85%" and a bare "Score: 85". Returns None when there is no score or it is out of range,
+    rather than guessing, so the caller falls back to its retry path.
+    """
+    match = SCORE_PATTERN.search(response or "")
+    if not match:
+        return None
+    value = float(match.group("value"))
+    scale = (match.group("scale") or "").replace(" ", "")
+    if scale == "%":
+        value /= 100
+    elif scale.startswith("/"):
+        denominator = float(scale[1:])
+        if not denominator:
+            return None
+        value /= denominator
+    elif value > 10:
+        # A bare number above 10 is a percentage, one above 1 a score out of 10.
+        value /= 100
+    elif value > 1:
+        value /= 10
+    return value if value <= 1 else None
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.date import DateTrigger
+from app.lib.Env import meeting_poll_min_seconds, meeting_poll_max_seconds
+from app.services.job_queue import (
+    JOB_COMPLETED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    MEETING_COMPLETED,
+    JobQueue,
+    job_queue
+)
+
+logger = logging.getLogger(__name__)
+
+POLLER_JOB_ID = "meeting_poller"
+# Each delay is randomly shortened or stretched by up to this fraction, so restarts don't poll in lockstep.
+POLL_JITTER = 0.1
+# How often a poll checks whether the job it queued has finished.
+JOB_STATUS_CHECK_SECONDS = 5
+
+
+class MeetingPoller:
+    """
+    Queues a poll of the meetings database on an adaptive schedule. The interval drops to the minimum
+    as soon as a poll finds meetings, and doubles after every poll that finds nothing or fails.
+
+    Runs are single-flight: the next run is only scheduled once the current one has finished,
+    and a run is skipped while another job, e.g. a manual trigger, is queued or running.
+    """
+
+    def __init__(self, queue: JobQueue, min_seconds: float, max_seconds: float):
+        self.queue = queue
+        self.min_seconds = min_seconds
+        self.max_seconds = max(max_seconds, min_seconds)
+        self.interval = min_seconds
+        self.scheduler: Optional[AsyncIOScheduler] = None
+
+    def start(self) -> None:
+        self.scheduler = AsyncIOScheduler()
+        self.scheduler.start()
+        self.schedule_next_poll(self.min_seconds)
+        logger.info(f"💡 Meeting poller started. Polling every {self.min_seconds:.0f}s to {self.max_seconds:.0f}s.")
+
+    def shutdown(self) -> None:
+        if self.scheduler is not None and self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        self.scheduler = None
+
+    def schedule_next_poll(self, delay: float) -> None:
+        delay *= random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        self.scheduler.add_job(
+            self.poll,
+            DateTrigger(run_date=datetime.now() + timedelta(seconds=delay)),
+            id=POLLER_JOB_ID,
+            replace_existing=True,
+            max_instances=1
+        )
+
+    async def wait_for_job(self, job_id: str) -> dict:
+        while True:
+            job = await asyncio.to_thread(self.queue.get_job, job_id)
+            if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                return job
+            await asyncio.sleep(JOB_STATUS_CHECK_SECONDS)
+
+    async def poll(self) -> None:
+        try:
+            if await asyncio.to_thread(self.queue.has_active_job):
+                logger.info("💡 A job is already queued or running. Skipping this poll.")
+                return
+
+            job_id, _ = await asyncio.to_thread(self.queue.enqueue)
+            self.queue.get_job_available_event().set()
+            job = await self.wait_for_job(job_id)
+
+            meetings_found = job["progress"]["meetings_found"] if job else 0
+            # Count only meetings that went through. A meeting that keeps failing is found on every poll
+            # until the watermark moves, and must not pin the interval at the minimum.
+            meetings_completed = job["progress"][MEETING_COMPLETED] if job else 0
+            if job and job["status"] == JOB_COMPLETED and meetings_completed:
+                # Meetings tend to arrive in bursts, so look again soon.
+                self.interval = self.min_seconds
+            else:
+                self.interval = min(self.interval * 2, self.max_seconds)
+            logger.info(f"💡 Poll found {meetings_found} meetings and completed {meetings_completed}. Next poll in about {self.interval:.0f}s.")
+        except Exception as e:
+            self.interval = min(self.interval * 2, self.max_seconds)
+            logger.error(f"🚨 Meeting poll failed: {str(e)}. Next poll in about {self.interval:.0f}s.")
+        finally:
+            if self.scheduler is not None:
+                self.schedule_next_poll(self.interval)
+
+
+meeting_poller = MeetingPoller(job_queue, meeting_poll_min_seconds, meeting_poll_max_seconds)
@@ -1,87 +1,185 @@
-from typing import List, Dict, Tuple
-import requests
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterable, Iterator, List, Dict, Optional, Tuple
+import asyncio
+import httpx
+import json
 from fastapi import HTTPException
-from app.lib.Env import notion_api_key, rainsound_meetings_database_id
+from app.lib.Env import rainsound_meetings_database_id
 import logging
 from app.services.chunk_text_with_2000_char_limit_for_notion import chunk_text_with_2000_char_limit_for_notion
 from app.services.parse_markdown_to_notion_blocks import (
     convert_content_to_blocks, 
+    make_blocks,
     parse_rich_text
 )
 from app.models import (
+    MeetingRecord,
     NotionBlock, 
     ToggleBlock
 )
-from tenacity import retry, stop_after_attempt, wait_exponential
-
-# Configuration Constants
-NOTION_VERSION = "2022-06-28"
-NOTION_API_BASE_URL = "https://api.notion.com/v1"
-HEADERS = {
-    "Notion-Version": NOTION_VERSION,
-    "Content-Type": "application/json"
-}
+from app.services.notion_client import get_notion_client
+from app.services.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Notion accepts at most 100 children per append and 500 KB per request body. Leave headroom for the envelope.
+NOTION_MAX_CHILDREN_PER_APPEND = 100
+NOTION_MAX_PAYLOAD_BYTES = 450_000
+NOTION_QUERY_PAGE_SIZE = 100
+# Attempts at an append that failed without Notion applying it. Rate limits are retried separately by the client.
+NOTION_APPEND_MAX_ATTEMPTS = 3
+# The only meeting properties the pipeline reads. Everything else is left out of query results.
+MEETING_PROPERTIES = ["Jumpshare Link", "Summarized"]
+
+meeting_property_ids: Optional[List[str]] = None
+
 class NotionBlockTracker:
     def __init__(self):
-        self.added_blocks = []
+        # Block id -> the id of the page or block it was appended to, in insertion order.
+        self.added_blocks: Dict[str, str] = {}
 
-    def add_block(self, block_id: str):
-        self.added_blocks.append(block_id)
+    def add_block(self, block_id: str, parent_id: str):
+        self.added_blocks[block_id] = parent_id
 
     def clear(self):
         self.added_blocks.clear()
 
-    def get_blocks(self):
-        return self.added_blocks
+    def get_blocks(self) -> List[str]:
+        return list(self.added_blocks)
 
-block_tracker = NotionBlockTracker()
+    def forget_tree(self, root_id: str):
+        """Stops tracking a block and everything appended under it, e.g. once the stage that built it completed."""
+        # Children are always tracked after their parent, so one pass in insertion order finds every descendant.
+        tree = {root_id}
+        for block_id, parent_id in self.added_blocks.items():
+            if parent_id in tree:
+                tree.add(block_id)
+        for block_id in tree:
+            self.added_blocks.pop(block_id, None)
 
-def get_headers() -> Dict[str, str]:
-    return {
-        "Authorization": f"Bearer {notion_api_key}",
-        **HEADERS
-    }
+    def get_root_blocks(self) -> List[str]:
+        """Blocks whose parent we didn't create. Archiving these removes everything nested under them."""
+        return [block_id for block_id, parent_id in self.added_blocks.items() if parent_id not in self.added_blocks]
+
+# Each meeting is processed in its own task and gets its own tracker, so one meeting's rollback never touches
+# another's blocks. Tasks spawned while processing a meeting inherit the context and share its tracker.
+current_block_tracker: ContextVar[NotionBlockTracker] = ContextVar("current_block_tracker", default=NotionBlockTracker())
+
+def get_block_tracker() -> NotionBlockTracker:
+    return current_block_tracker.get()
+
+def get_block_signature(block: Dict) -> Tuple[str, str]:
+    rich_text = block.get(block["type"], {}).get("rich_text", [])
+    return block["type"], "".join(item.get("plain_text") or item.get("text", {}).get("content", "") for item in rich_text)
+
+async def get_block_children(block_id: str) -> List[Dict]:
+    children = []
+    params = {"page_size": NOTION_QUERY_PAGE_SIZE}
+    while True:
+        response = await get_notion_client().request("GET", f"/blocks/{block_id}/children", params=params)
+        response.raise_for_status()
+        data = response.json()
+        children.extend(data.get("results", []))
+        if not data.get("has_more"):
+            return children
+        params = {"page_size": NOTION_QUERY_PAGE_SIZE, "start_cursor": data["next_cursor"]}
+
+async def find_applied_append(parent_id: str, blocks: List[NotionBlock]) -> Optional[List[Dict]]:
+    """
+    Checks whether an append that failed ambiguously went through anyway, i.e. whether the parent's last
+    children are the blocks we sent. Returns those children if so.
+    """
+    children = await get_block_children(parent_id)
+    applied_blocks = children[-len(blocks):]
+    if len(applied_blocks) == len(blocks) and all(
+        get_block_signature(child) == get_block_signature(block) for child, block in zip(applied_blocks, blocks)
+    ):
+        return applied_blocks
+    return None
 
-# @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 async def append_blocks_to_notion(toggle_id: str, blocks: List[NotionBlock]) -> Dict:
-    blocks_url = f"{NOTION_API_BASE_URL}/blocks/{toggle_id}/children"
-    headers = get_headers()
+    """
+    Appends children to a block or page. Appends aren't idempotent, so after a timeout or a server error
+    the parent's children are checked before appending again. Otherwise the blocks could end up on the page
+    twice, with only the second copy tracked for rollback.
+    """
     data = {"children": blocks}
-    response = requests.patch(blocks_url, headers=headers, json=data)
-    response.raise_for_status()
-    return response.json()
+    for attempt in range(1, NOTION_APPEND_MAX_ATTEMPTS + 1):
+        try:
+            response = await get_notion_client().request("PATCH", f"/blocks/{toggle_id}/children", json=data, idempotent=False)
+            if response.status_code < 500 and response.status_code != 409:
+                response.raise_for_status()
+                return response.json()
+            error = f"status {response.status_code}"
+        except httpx.TransportError as e:
+            error = str(e)
+        if attempt == NOTION_APPEND_MAX_ATTEMPTS:
+            raise HTTPException(status_code=502, detail=f"Failed to append blocks to Notion: {error}")
 
-async def rollback_blocks():
-    for block_id in block_tracker.get_blocks():
-        await delete_block(block_id)
+        applied_blocks = await find_applied_append(toggle_id, blocks)
+        if applied_blocks is not None:
+            logger.info(f"💡 Append to {toggle_id} failed ({error}) but Notion applied it. Not appending again.")
+            return {"results": applied_blocks}
+        logger.warning(f"⚠️ Append to {toggle_id} failed ({error}) and was not applied. Retrying... (Attempt {attempt + 1}/{NOTION_APPEND_MAX_ATTEMPTS})")
+        await asyncio.sleep(2 ** attempt)
+
+async def rollback_blocks() -> List[str]:
+    """
+    Deletes the tracked blocks concurrently, within the Notion client's rate limit. Only root blocks are deleted,
+    since Notion archives their children along with them.
+
+    :return: The ids of the root blocks that could not be deleted.
+    """
+    block_tracker = get_block_tracker()
+    root_block_ids = block_tracker.get_root_blocks()
     block_tracker.clear()
+    results = await asyncio.gather(*(delete_block(block_id) for block_id in root_block_ids), return_exceptions=True)
+    failed_block_ids = [block_id for block_id, deleted in zip(root_block_ids, results) if deleted is not True]
+    if failed_block_ids:
+        logger.error(f"🚨 Rollback failed to delete {len(failed_block_ids)} of {len(root_block_ids)} blocks: {failed_block_ids}")
+    else:
+        logger.info(f"💡 Rolled back {len(root_block_ids)} blocks.")
+    return failed_block_ids
 
-# @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def delete_block(block_id: str):
-    url = f"{NOTION_API_BASE_URL}/blocks/{block_id}"
-    headers = get_headers()
-    response = requests.delete(url, headers=headers)
+async def delete_block(block_id: str) -> bool:
+    response = await get_notion_client().request("DELETE", f"/blocks/{block_id}")
     if response.status_code != 200:
         logger.error(f"🚨 Failed to delete block {block_id}: {response.text}")
+        return False
+    return True
 
 async def safe_append_blocks_to_notion(toggle_id: str, blocks: List[NotionBlock]) -> Tuple[Dict, List[str]]:
     try:
         response = await append_blocks_to_notion(toggle_id, blocks)
         block_ids = [block['id'] for block in response['results']]
         for block_id in block_ids:
-            block_tracker.add_block(block_id)
+            get_block_tracker().add_block(block_id, parent_id=toggle_id)
         return response, block_ids
     except Exception as e:
         logger.error(f"🚨 Error appending blocks to Notion: {str(e)}")
         raise
 
+def batch_blocks_for_notion(blocks: Iterable[NotionBlock]) -> Iterator[List[NotionBlock]]:
+    """Packs blocks into as few append requests as Notion's children and payload size limits allow."""
+    batch = []
+    batch_size = 0
+    for block in blocks:
+        block_size = len(json.dumps(block, ensure_ascii=False).encode())
+        if batch and (len(batch) == NOTION_MAX_CHILDREN_PER_APPEND or batch_size + block_size > NOTION_MAX_PAYLOAD_BYTES):
+            yield batch
+            batch = []
+            batch_size = 0
+        batch.append(block)
+        batch_size += block_size
+    if batch:
+        yield batch
+
 async def append_section_to_notion(toggle_id: str, section_content: str, section_name: str) -> None:
     blocks: List[NotionBlock] = convert_content_to_blocks(section_content)
     try:
-        response, block_ids = await safe_append_blocks_to_notion(toggle_id, blocks)
+        with span("notion_append_section", section=section_name, blocks=len(blocks)):
+            for batch in batch_blocks_for_notion(blocks):
+                await safe_append_blocks_to_notion(toggle_id, batch)
     except Exception as e:
         logger.error(f"🚨 Failed to append {section_name} to Notion: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to append {section_name} to Notion")
@@ -96,27 +194,25 @@ async def append_next_actions_to_notion(toggle_id: str, section_content: str) ->
     await append_section_to_notion(toggle_id, section_content, "Next Steps")
 
 async def upload_transcript_to_notion(toggle_id: str, transcription: str) -> None:
-    transcription_chunks: List[str] = chunk_text_with_2000_char_limit_for_notion(transcription)
+    # Chunking, block building and batching are all lazy, so the first append goes out
+    # as soon as its blocks are ready rather than after the whole transcript is chunked.
+    transcription_chunks: Iterator[str] = chunk_text_with_2000_char_limit_for_notion(transcription)
+    blocks: Iterator[NotionBlock] = (
+        block
+        for transcription_chunk in transcription_chunks
+        for block in make_blocks("paragraph", parse_rich_text(transcription_chunk))
+    )
     try:
-        for transcription_chunk in transcription_chunks:
-            blocks: List[NotionBlock] = [
-                {
-                    "object": "block",
-                    "type": "paragraph",
-                    "paragraph": {
-                        "rich_text": parse_rich_text(transcription_chunk)
-                    }
-                }
-            ]
-            await safe_append_blocks_to_notion(toggle_id, blocks)
+        with span("notion_upload_transcript") as upload_span:
+            # Block ids from every batch are still tracked for rollback by safe_append_blocks_to_notion.
+            for batch_number, batch in enumerate(batch_blocks_for_notion(blocks), start=1):
+                await safe_append_blocks_to_notion(toggle_id, batch)
+                upload_span.set(batches=batch_number)
     except Exception as e:
         logger.error(f"🚨 Error uploading transcript to Notion: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to upload transcript to Notion")
 
-# @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
 async def set_summarized_checkbox_on_notion_page_to_true(page_id: str) -> None:
-    update_url = f"{NOTION_API_BASE_URL}/pages/{page_id}"
-    headers = get_headers()
     data = {
         "properties": {
             "Summarized": {
@@ -124,9 +220,18 @@ async def set_summarized_checkbox_on_notion_page_to_true(page_id: str) -> None:
             }
         }
     }
-    response = requests.patch(update_url, headers=headers, json=data)
+    response = await get_notion_client().request("PATCH", f"/pages/{page_id}", json=data)
     response.raise_for_status()
 
+async def is_page_summarized(page_id: str) -> bool:
+    """Reads the page's Summarized checkbox as it is now, rather than as some earlier query saw it."""
+    property_ids = await get_meeting_property_ids()
+    params = {"filter_properties": property_ids} if property_ids else None
+    response = await get_notion_client().request("GET", f"/pages/{page_id}", params=params)
+    response.raise_for_status()
+    summarized = response.json().get("properties", {}).get("Summarized", {})
+    return bool(summarized.get("checkbox"))
+
 async def create_toggle_block(page_id: str, title: str, color: str = "blue") -> str:
     toggle_block: ToggleBlock = {
         "object": "block",
@@ -148,26 +253,58 @@ async def create_toggle_block(page_id: str, title: str, color: str = "blue") ->
     }
     response, _ = await safe_append_blocks_to_notion(page_id, [toggle_block])
     toggle_id = response['results'][0]['id']
-    block_tracker.add_block(toggle_id)  # Track the toggle block itself
     return toggle_id
 
-# @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def get_meetings_with_jumpshare_links_and_unsummarized_from_notion() -> List[Dict]:
-    try:
-        headers = get_headers()
-        filter_data = {
-            "filter": {
-                "and": [
-                    {"property": "Jumpshare Link", "url": {"is_not_empty": True}},
-                    {"property": "Summarized", "checkbox": {"equals": False}}
-                ]
-            }
-        }
-        rainsound_meetings_database_url = f"https://api.notion.com/v1/databases/{rainsound_meetings_database_id}/query"
-        response = requests.post(rainsound_meetings_database_url, headers=headers, json=filter_data)
+async def get_meeting_property_ids() -> Optional[List[str]]:
+    """
+    Looks up the ids of the properties the pipeline reads, so database queries can ask for just those.
+    The lookup is cached for the life of the process.
+    """
+    global meeting_property_ids
+    if meeting_property_ids is None:
+        response = await get_notion_client().request("GET", f"/databases/{rainsound_meetings_database_id}")
+        if response.status_code != 200:
+            logger.warning(f"⚠️ Could not read the meetings database schema, fetching all properties: {response.text}")
+            return None
+        properties = response.json().get("properties", {})
+        meeting_property_ids = [properties[name]["id"] for name in MEETING_PROPERTIES if name in properties]
+    return meeting_property_ids
+
+async def iter_meetings_with_jumpshare_links_and_unsummarized_from_notion(edited_since: Optional[str] = None) -> AsyncIterator[MeetingRecord]:
+    """
+    Streams every matching meeting across all result pages of the database query.
+
+    :param edited_since: ISO 8601 timestamp. When given, only pages edited on or after it are returned.
+    """
+    filters = [
+        {"property": "Jumpshare Link", "url": {"is_not_empty": True}},
+        {"property": "Summarized", "checkbox": {"equals": False}}
+    ]
+    if edited_since:
+        filters.append({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": edited_since}})
+    query = {
+        "filter": {"and": filters},
+        "sorts": [{"timestamp": "last_edited_time", "direction": "ascending"}],
+        "page_size": NOTION_QUERY_PAGE_SIZE
+    }
+    property_ids = await get_meeting_property_ids()
+    params = {"filter_properties": property_ids} if property_ids else None
+
+    while True:
+        response = await get_notion_client().request(
+            "POST", f"/databases/{rainsound_meetings_database_id}/query", json=query, params=params
+        )
         response.raise_for_status()
         notion_data = response.json()
-        return notion_data.get('results', [])
-    except requests.exceptions.RequestException as e:
+        for page in notion_data.get('results', []):
+            yield MeetingRecord.from_notion_page(page)
+        if not notion_data.get('has_more') or not notion_data.get('next_cursor'):
+            break
+        query["start_cursor"] = notion_data['next_cursor']
+
+async def get_meetings_with_jumpshare_links_and_unsummarized_from_notion(edited_since: Optional[str] = None) -> List[MeetingRecord]:
+    try:
+        return [meeting async for meeting in iter_meetings_with_jumpshare_links_and_unsummarized_from_notion(edited_since)]
+    except httpx.HTTPError as e:
         logger.error(f"🚨 Failed to fetch meetings from Notion: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch meetings from Notion")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch meetings from Notion")
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+import httpx
+from app.lib.Env import notion_api_key, notion_requests_per_second
+from app.services.stage_limits import stage_limit
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+NOTION_VERSION = "2022-06-28"
+NOTION_API_BASE_URL = "https://api.notion.com/v1"
+NOTION_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+NOTION_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=10)
+NOTION_MAX_ATTEMPTS = 5
+NOTION_MAX_RETRY_DELAY = 60.0
+# 409 is Notion's conflict_error, which it documents as safe to retry.
+RETRYABLE_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+# For writes that aren't idempotent, only failures that prove Notion never applied the request are retried.
+# A rate limited request was rejected outright, and a connection that was never made carried nothing.
+UNAPPLIED_STATUS_CODES = {429}
+UNSENT_REQUEST_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class TokenBucket:
+    """
+    Allows `rate` acquisitions per second on average, with bursts of up to `capacity`.
+    `pause` holds every caller back, for when the server tells us to slow down.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+def get_retry_after(response: httpx.Response) -> Optional[float]:
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            return (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+
+class NotionClient:
+    """
+    One keep-alive connection pool for every Notion call, behind a token bucket tuned to Notion's rate limit.
+    Rate limited and transient failures are retried, honouring Retry-After.
+    """
+
+    def __init__(self, api_key: Optional[str], requests_per_second: float):
+        self.api_key = api_key
+        self.rate_limiter = TokenBucket(rate=requests_per_second, capacity=max(requests_per_second, 1))
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+    def get_http_client(self) -> httpx.AsyncClient:
+        if self.http_client is None or self.http_client.is_closed:
+            self.http_client = httpx.AsyncClient(
+                base_url=NOTION_API_BASE_URL,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Notion-Version": NOTION_VERSION,
+                    "Content-Type": "application/json"
+                },
+                timeout=NOTION_TIMEOUT,
+                limits=NOTION_LIMITS
+            )
+        return self.http_client
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+        idempotent: bool = True
+    ) -> httpx.Response:
+        """
+        Sends a request, retrying rate limits and transient failures.
+
+        :param idempotent: Pass False for writes that must not be applied twice, like appending children.
+            Those are only retried when Notion certainly didn't apply them. Any other failure is raised
+            or returned, and the caller has to check what Notion did before trying again.
+        """
+        with span("notion_request", method=method) as request_span:
+            for attempt in range(1, NOTION_MAX_ATTEMPTS + 1):
+                request_span.set(attempts=attempt)
+                await self.rate_limiter.acquire()
+                try:
+                    # The token bucket spaces requests out. This caps how many slow ones can pile up in flight.
+                    async with stage_limit("notion"):
+                        response = await self.get_http_client().request(method, path, json=json, params=params)
+                except httpx.TransportError as e:
+                    if attempt == NOTION_MAX_ATTEMPTS or not (idempotent or isinstance(e, UNSENT_REQUEST_ERRORS)):
+                        raise
+                    delay = min((2 ** attempt) * random.uniform(0.5, 1.0), NOTION_MAX_RETRY_DELAY)
+                    logger.warning(f"⚠️ Notion {method} {path} failed ({str(e)}). Retrying in {delay:.1f}s... (Attempt {attempt + 1}/{NOTION_MAX_ATTEMPTS})")
+                    await asyncio.sleep(delay)
+                    continue
+
+                request_span.set(status_code=response.status_code)
+                retryable_status_codes = RETRYABLE_STATUS_CODES if idempotent else UNAPPLIED_STATUS_CODES
+                if response.status_code not in retryable_status_codes or attempt == NOTION_MAX_ATTEMPTS:
+                    return response
+
+                retry_after = get_retry_after(response)
+                delay = retry_after if retry_after is not None else (2 ** attempt) * random.uniform(0.5, 1.0)
+                delay = min(max(delay, 0.0), NOTION_MAX_RETRY_DELAY)
+                if response.status_code == 429:
+                    # The limit is per integration, so every caller has to back off, not just this one.
+                    self.rate_limiter.pause(delay)
+                logger.warning(f"⚠️ Notion {method} {path} returned {response.status_code}. Retrying in {delay:.1f}s... (Attempt {attempt + 1}/{NOTION_MAX_ATTEMPTS})")
+                await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        if self.http_client is not None and not self.http_client.is_closed:
+            await self.http_client.aclose()
+        self.http_client = None
+
+
+_client: Optional[NotionClient] = None
+
+def get_notion_client() -> NotionClient:
+    global _client
+    if _client is None:
+        _client = NotionClient(notion_api_key, notion_requests_per_second)
+    return _client
+
+def set_notion_client(client) -> None:
+    """Replaces the shared client, e.g. with an offline stand-in for benchmarks."""
+    global _client
+    _client = client
+
+async def close_notion_client() -> None:
+    global _client
+    if _client is not None and hasattr(_client, "close"):
+        await _client.close()
+    _client = None
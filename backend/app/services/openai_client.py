@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import random
+import re
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, TypeVar
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from app.lib.Env import open_ai_api_key, openai_concurrency
+from app.lib.Logging import log_payload_artifact
+from app.services.stage_limits import stage_limit
+from app.services.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# o1-mini regularly takes well over a minute to answer, so the read timeout is generous.
+OPENAI_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+OPENAI_LIMITS = httpx.Limits(max_connections=openai_concurrency * 2, max_keepalive_connections=openai_concurrency)
+OPENAI_MAX_ATTEMPTS = 5
+OPENAI_MAX_RETRY_DELAY = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+DURATION_PART_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+_client: Optional[AsyncOpenAI] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(
+            api_key=open_ai_api_key,
+            # Retries are handled by call_with_retries so they can share the concurrency limit.
+            max_retries=0,
+            timeout=OPENAI_TIMEOUT,
+            http_client=httpx.AsyncClient(timeout=OPENAI_TIMEOUT, limits=OPENAI_LIMITS)
+        )
+    return _client
+
+def set_openai_client(client) -> None:
+    """Replaces the shared client, e.g. with an offline stand-in for benchmarks."""
+    global _client
+    _client = client
+
+async def close_openai_client() -> None:
+    global _client
+    if _client is not None and hasattr(_client, "close"):
+        await _client.close()
+    _client = None
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parses OpenAI's rate limit reset durations, e.g. "20ms", "1s" or "6m0s"."""
+    parts = DURATION_PART_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNIT_SECONDS[unit] for amount, unit in parts)
+
+def get_retry_delay_from_headers(headers: httpx.Headers) -> Optional[float]:
+    if retry_after_ms := headers.get("retry-after-ms"):
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    if retry_after := headers.get("retry-after"):
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                pass
+    resets = [
+        parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+def get_retry_delay(error: Exception, attempt: int) -> float:
+    delay = None
+    if isinstance(error, APIStatusError):
+        delay = get_retry_delay_from_headers(error.response.headers)
+    if delay is None:
+        # Exponential backoff with jitter, so concurrent sections don't retry in lockstep.
+        delay = (2 ** attempt) * random.uniform(0.5, 1.0)
+    return min(max(delay, 0.0), OPENAI_MAX_RETRY_DELAY)
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    # Covers connection errors and timeouts.
+    return isinstance(error, APIConnectionError)
+
+async def call_with_retries(operation: Callable[[], Awaitable[T]], description: str, stage: str = "llm") -> T:
+    """
+    Runs an OpenAI request under its stage's process-wide concurrency limit, retrying transient failures.
+    Rate limit headers decide how long to wait when the API provides them.
+    """
+    with span(f"openai_{stage}") as openai_span:
+        for attempt in range(1, OPENAI_MAX_ATTEMPTS + 1):
+            openai_span.set(attempts=attempt)
+            async with stage_limit(stage):
+                try:
+                    result = await operation()
+                except Exception as e:
+                    if isinstance(e, APIStatusError):
+                        openai_span.set(status_code=e.status_code)
+                    if not is_retryable(e) or attempt == OPENAI_MAX_ATTEMPTS:
+                        raise
+                    delay = get_retry_delay(e, attempt)
+                    error_message = str(e)
+                else:
+                    usage = getattr(result, "usage", None)
+                    if usage is not None:
+                        openai_span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+                    return result
+            # Sleep outside the semaphore so a backing-off request doesn't hold a slot.
+            logger.warning(f"⚠️ {description} failed ({error_message}). Retrying in {delay:.1f}s... (Attempt {attempt + 1}/{OPENAI_MAX_ATTEMPTS})")
+            await asyncio.sleep(delay)
+
+async def create_chat_completion(prompt: str, model: str = "o1-mini") -> ChatCompletion:
+    # Full prompts and responses only ever go to the per-meeting artifact file, and only in debug mode.
+    log_payload_artifact("prompt", prompt, model=model)
+    response = await call_with_retries(
+        lambda: get_openai_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ]
+        ),
+        f"{model} chat completion"
+    )
+    if response.choices:
+        log_payload_artifact("response", response.choices[0].message.content or "", model=model)
+    return response
+
+async def create_transcription(file_name: str, audio: bytes, mime_type: str) -> str:
+    return await call_with_retries(
+        lambda: get_openai_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=(file_name, audio, mime_type),
+            response_format="text"
+        ),
+        f"Whisper transcription of {file_name}",
+        stage="whisper"
+    )
@@ -1,185 +1,162 @@
 import re
+from typing import Dict, List, Optional
+from app.lib.Strings import split_utf16, utf16_length
 
-def parse_bold(text):
-    """
-    Parses bold markdown-like directives in text.
-    
-    :param text: A string containing the text to parse.
-    :return: A list of rich text objects with bold annotations where applicable.
-    """
-    rich_text = []
-    
-    # Regular expression to identify bold text
-    bold_pattern = re.compile(r'\*\*([^*]+)\*\*')
-    
-    parts = bold_pattern.split(text)
-    i = 0
-    while i < len(parts):
-        if i + 1 < len(parts):
-            # Regular text before bold
-            regular_text = parts[i]
-            if regular_text:
-                rich_text.append({
-                    "type": "text",
-                    "text": {
-                        "content": regular_text
-                    }
-                })
-            # Bold text
-            bold_text = parts[i + 1]
-            rich_text.append({
-                "type": "text",
-                "text": {
-                    "content": bold_text
-                },
-                "annotations": {
-                    "bold": True
-                }
-            })
-            i += 2
+# Notion rejects a rich text object whose content is longer than 2000 UTF-16 code units,
+# and a block with more than 100 rich text objects.
+NOTION_MAX_TEXT_LENGTH = 2000
+NOTION_MAX_RICH_TEXT_ITEMS = 100
+
+# Every inline construct in one alternation, so a line is scanned once. The inner text of bold, italic and
+# link matches is scanned again with the outer style applied, which is how bold inside a link works.
+# Each alternative starts with its marker character, and the italic boundary checks look behind the marker,
+# so the regex engine can skip straight from one candidate marker to the next.
+INLINE_PATTERN = re.compile(
+    r'`(?P<code>[^`]+)`'
+    r'|\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)\)'
+    r'|\*\*(?P<bold>[^*]+(?:\*[^*]+)*?)\*\*'
+    r'|\*(?<![\w*]\*)(?P<italic>[^*\s](?:[^*]*[^*\s])?)\*(?![\w*])'
+    r'|_(?<!\w_)(?P<underscore_italic>[^_\s](?:[^_]*[^_\s])?)_(?!\w)'
+)
+
+BLOCK_PATTERN = re.compile(
+    r'(?P<heading>#{1,6})\s+(?P<heading_text>.*)'
+    r'|(?P<divider>(?:-{3,}|\*{3,}|_{3,}))$'
+    r'|[-*+]\s+(?P<bullet_text>.*)'
+    r'|\d+[.)]\s+(?P<number_text>.*)'
+    r'|>\s?(?P<quote_text>.*)'
+)
+
+# Styles are bit flags, so nesting a style is a single `|`.
+PLAIN = 0
+BOLD = 1
+ITALIC = 2
+CODE = 4
+
+# One annotations object per style, shared by every span with that style instead of rebuilt for each one.
+ANNOTATIONS: List[Dict[str, bool]] = [
+    {name: True for name, flag in (("bold", BOLD), ("italic", ITALIC), ("code", CODE)) if style & flag}
+    for style in range(8)
+]
+
+def has_inline_markers(text: str) -> bool:
+    return "*" in text or "[" in text or "`" in text or "_" in text
+
+def append_text(rich_text: List[Dict], content: str, style: int, link: Optional[str]) -> None:
+    # A character is at most two UTF-16 code units, so short spans never need measuring.
+    if len(content) * 2 > NOTION_MAX_TEXT_LENGTH and utf16_length(content) > NOTION_MAX_TEXT_LENGTH:
+        for piece in split_utf16(content, NOTION_MAX_TEXT_LENGTH):
+            append_text(rich_text, piece, style, link)
+        return
+    text_object = {"content": content, "link": {"url": link}} if link else {"content": content}
+    if style:
+        rich_text.append({"type": "text", "text": text_object, "annotations": ANNOTATIONS[style]})
+    else:
+        rich_text.append({"type": "text", "text": text_object})
+
+def scan_inline(rich_text: List[Dict], text: str, style: int, link: Optional[str]) -> None:
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        start = match.start()
+        if start > position:
+            append_text(rich_text, text[position:start], style, link)
+        kind = match.lastgroup
+        inner = match.group(kind)
+        if kind == "code":
+            append_text(rich_text, inner, style | CODE, link)
+        elif kind == "link_url":
+            link_text = match.group("link_text")
+            if has_inline_markers(link_text):
+                scan_inline(rich_text, link_text, style, inner)
+            else:
+                append_text(rich_text, link_text, style, inner)
         else:
-            # Remaining text without bold
-            remaining_text = parts[i]
-            if remaining_text:
-                rich_text.append({
-                    "type": "text",
-                    "text": {
-                        "content": remaining_text
-                    }
-                })
-            i += 1
-    
-    return rich_text
+            inner_style = style | (BOLD if kind == "bold" else ITALIC)
+            if has_inline_markers(inner):
+                scan_inline(rich_text, inner, inner_style, link)
+            else:
+                append_text(rich_text, inner, inner_style, link)
+        position = match.end()
+    if position < len(text):
+        append_text(rich_text, text[position:], style, link)
 
-def parse_rich_text(text):
+def parse_rich_text(text: str, style: int = PLAIN) -> List[Dict]:
     """
     Parses a line of text and converts markdown-like directives into Notion's rich text format.
-    
+    Supports bold, italics, inline code and links, nested in any order. Text objects longer than
+    Notion's 2000 character limit are split into several.
+
     :param text: A string containing the text to parse.
+    :param style: The style every span starts from, e.g. BOLD for headings.
     :return: A list of rich text objects compatible with Notion API.
     """
-    rich_text = []
-    
-    # Regular expressions for different markdown-like patterns
-    link_pattern = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
-    # bold_pattern = re.compile(r'\*\*([^*]+)\*\*')
-    
-    # Split the text into parts based on links
-    parts = link_pattern.split(text)
-    i = 0
-    while i < len(parts):
-        if i + 2 < len(parts):
-            # Text before link
-            pre_link = parts[i]
-            if pre_link:
-                rich_text.extend(parse_bold(pre_link))
-            # Link text and URL
-            link_text = parts[i + 1]
-            link_url = parts[i + 2]
-            rich_text.append({
-                "type": "text",
-                "text": {
-                    "content": link_text,
-                    "link": {
-                        "url": link_url
-                    }
-                }
-            })
-            i += 3
-        else:
-            # Remaining text without links
-            remaining_text = parts[i]
-            if remaining_text:
-                rich_text.extend(parse_bold(remaining_text))
-            i += 1
-    
+    rich_text: List[Dict] = []
+    if not has_inline_markers(text):
+        if text:
+            append_text(rich_text, text, style, None)
+        return rich_text
+    scan_inline(rich_text, text, style, None)
     return rich_text
 
-def convert_line_to_block(line):
+def make_blocks(block_type: str, rich_text: List[Dict]) -> List[Dict]:
+    """Builds one block, or several consecutive ones of the same type when the rich text has too many objects."""
+    return [
+        {
+            "object": "block",
+            "type": block_type,
+            block_type: {
+                "rich_text": rich_text[start:start + NOTION_MAX_RICH_TEXT_ITEMS]
+            }
+        }
+        for start in range(0, max(len(rich_text), 1), NOTION_MAX_RICH_TEXT_ITEMS)
+    ]
+
+def convert_line_to_blocks(line: str) -> List[Dict]:
     """
-    Converts a single line of text with markdown-like directives into a Notion block.
-    
+    Converts a single line of text with markdown-like directives into Notion blocks. A line is usually
+    one block, but is split into several when it holds more rich text objects than Notion allows per block.
+
     :param line: A string containing the line to convert.
-    :return: A Notion block object or None if the line is empty.
+    :return: A list of Notion block objects, empty if the line is empty.
     """
     line = line.strip()
     if not line:
-        return None
-    
-    # Section Titles
-    if line.startswith("## "):
-        title = line[3:].strip()
-        return {
-            "object": "block",
-            "type": "heading_2",
-            "heading_2": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": title
-                        },
-                        "annotations": {
-                            "bold": True
-                        }
-                    }
-                ]
-            }
-        }
-    
+        return []
+
+    match = BLOCK_PATTERN.match(line)
+    if match:
+        kind = match.lastgroup
+        if kind == "heading_text":
+            level = min(len(match.group("heading")), 3)
+            return make_blocks(f"heading_{level}", parse_rich_text(match.group("heading_text").strip(), BOLD))
+        if kind == "divider":
+            return [{"object": "block", "type": "divider", "divider": {}}]
+        if kind == "bullet_text":
+            return make_blocks("bulleted_list_item", parse_rich_text(match.group("bullet_text")))
+        if kind == "number_text":
+            return make_blocks("numbered_list_item", parse_rich_text(match.group("number_text")))
+        if kind == "quote_text":
+            return make_blocks("quote", parse_rich_text(match.group("quote_text").strip()))
+
     # Subsection Titles
-    elif line.startswith("**") and line.endswith("**"):
-        sub_title = line[2:-2].strip()
-        return {
-            "object": "block",
-            "type": "heading_3",
-            "heading_3": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": sub_title
-                        },
-                        "annotations": {
-                            "bold": True
-                        }
-                    }
-                ]
-            }
-        }
-    
+    if line.startswith("**") and line.endswith("**") and len(line) > 4 and "**" not in line[2:-2]:
+        return make_blocks("heading_3", parse_rich_text(line[2:-2].strip(), BOLD))
+
     # Direct Quotes
-    elif line.startswith('"') and line.endswith('"'):
-        quote_text = line[1:-1].strip()
-        return {
-            "object": "block",
-            "type": "quote",
-            "quote": {
-                "rich_text": parse_rich_text(quote_text)
-            }
-        }
-    
+    if line.startswith('"') and line.endswith('"') and len(line) > 1:
+        return make_blocks("quote", parse_rich_text(line[1:-1].strip()))
+
     # Regular Paragraph
-    else:
-        return {
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": parse_rich_text(line)
-            }
-        }
+    return make_blocks("paragraph", parse_rich_text(line))
 
-def convert_content_to_blocks(content):
+def convert_content_to_blocks(content: str) -> List[Dict]:
     """
     Converts multi-line content into a list of Notion blocks.
-    
+
     :param content: A string containing the multi-line content.
     :return: A list of Notion block objects.
     """
     blocks = []
-    lines = content.split('\n')
-    for line in lines:
-        block = convert_line_to_block(line)
-        if block:
-            blocks.append(block)
-    return blocks
\ No newline at end of file
+    for line in content.split('\n'):
+        blocks.extend(convert_line_to_blocks(line))
+    return blocks
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Dict
+from app.lib.Env import (
+    download_concurrency,
+    ffmpeg_concurrency,
+    whisper_concurrency,
+    openai_concurrency,
+    notion_concurrency
+)
+
+# Process-wide limits per resource. Meetings run concurrently, but they all share these,
+# so adding meetings never multiplies the load on any one service or on the CPU.
+STAGE_LIMITS: Dict[str, int] = {
+    "download": download_concurrency,
+    "ffmpeg": ffmpeg_concurrency,
+    "whisper": whisper_concurrency,
+    "llm": openai_concurrency,
+    "notion": notion_concurrency,
+}
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def stage_limit(stage: str) -> asyncio.Semaphore:
+    """
+    Returns the shared semaphore for a stage, e.g. `async with stage_limit("ffmpeg"):`.
+    Semaphores are created on first use so they belong to the running event loop.
+    """
+    if stage not in _semaphores:
+        _semaphores[stage] = asyncio.Semaphore(max(STAGE_LIMITS[stage], 1))
+    return _semaphores[stage]
@@ -1,36 +1,56 @@
 # summarize.py
-from app.lib.Env import open_ai_api_key
 from fastapi import HTTPException
+import asyncio
 import os
 import logging
-from openai import OpenAI, OpenAIError
+from openai import OpenAIError
 from app.services.notion import (
     append_intro_to_notion,
     append_direct_quotes_to_notion,
     append_next_actions_to_notion,
 )
 from app.models import Transcription
+from app.lib.Logging import truncate_payload
 from app.services.eval_agent import evaluate_section
+from app.services.job_store import MeetingCheckpoints
+from app.services.openai_client import create_chat_completion
+from app.services.local_checks import TranscriptIndex, check_section
+from app.services.token_budget import count_tokens, split_into_token_windows
+from app.services.tracing import span
+from app.lib.Env import (
+    summary_section_concurrency,
+    summary_candidate_count,
+    summary_single_pass_token_limit,
+    summary_window_tokens,
+    summary_window_overlap_tokens
+)
+from typing import Any, Dict, Optional
 # from tenacity import retry, stop_after_attempt, wait_exponential
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
-client = OpenAI(api_key=open_ai_api_key)
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PROMPTS_FILES = ["intro.txt", "direct_quotes.txt", "next_actions.txt"]
+MAX_ATTEMPTS = 5
+QUALITY_THRESHOLD = 0.8
+# Room left in the prompt for the evaluator feedback appended on retries.
+FEEDBACK_RESERVE_TOKENS = 2000
+# Notes that still don't fit after this many map rounds are used as they are.
+MAX_MAP_ROUNDS = 3
+# Taken off the evaluator's score for each local check warning, e.g. a missing heading.
+LOCAL_CHECK_WARNING_PENALTY = 0.1
+
 def read_file(file_path):
     with open(file_path, 'r') as f:
         return f.read()
 
+def get_section_name(file_name: str) -> str:
+    return file_name.split('.')[0].replace('_', ' ').title()
+
 async def summarize_transcription(transcription: str, prompt: str) -> str:
     try:
         logger.info("🌺 Received request for summarization.")
-        response = client.chat.completions.create(
-            model="o1-mini",
-            messages=[
-                {"role": "user", "content": prompt + transcription}
-            ]
-        )
+        response = await create_chat_completion(prompt + transcription)
         summary = response.choices[0].message.content
         return summary
     except OpenAIError as e:
@@ -44,54 +64,255 @@ async def summarize_transcription(transcription: str, prompt: str) -> str:
 async def upload_to_notion(append_function, toggle_id, section_content):
     await append_function(toggle_id=toggle_id, section_content=section_content)
 
-async def decomposed_summarize_transcription_and_upload_to_notion(transcription: Transcription, toggle_id: str) -> None:
-    prompt_boilerplate = read_file(os.path.join(BASE_DIR, 'prompts/prompt_boilerplate/context.txt'))
-    prompts_files = ["intro.txt", "direct_quotes.txt", "next_actions.txt"]
-    max_attempts = 5
-    quality_threshold = 0.8
-    summary_chunks = []
-    
-    for file_name in prompts_files:
-        section_name = file_name.split('.')[0].replace('_', ' ').title()
-        prompt_content = read_file(os.path.join(BASE_DIR, 'prompts', file_name))
-        
-        best_score = 0
-        best_summary = ""
-        feedback_history = ""
-
-        for attempt in range(max_attempts):
-            full_prompt = prompt_boilerplate + prompt_content + f"\n\nPrevious feedback:\n{feedback_history}"
-            logger.info(f"💡 Prompt for {section_name} - Attempt {attempt + 1}:\n{full_prompt}")
-            decomposed_summary = await summarize_transcription(transcription, full_prompt)
-            
+async def generate_candidate(
+    transcription: Transcription,
+    prompt: str,
+    section_name: str,
+    transcript_index: Optional[TranscriptIndex] = None
+) -> Dict[str, Any]:
+    with span("generate_candidate", section=section_name) as candidate_span:
+        decomposed_summary = await summarize_transcription(transcription, prompt)
+
+        # Candidates with fabricated quotes are rejected without paying for an LLM evaluation.
+        rejections, warnings = check_section(decomposed_summary, section_name, transcript_index)
+        if rejections:
+            candidate_span.set(local_checks_failed=len(rejections), score=0)
+            logger.info(f"💡 {section_name} candidate failed local checks: {rejections}")
+            return {
+                'summary': decomposed_summary,
+                'score': 0,
+                'feedback': "",
+                'problems': rejections + warnings,
+            }
+
+        try:
+            evaluation_result = await evaluate_section(transcription, decomposed_summary, section_name)
+        except Exception as e:
+            logger.error(f"🚨 Error evaluating {section_name}: {str(e)}")
+            evaluation_result = {"score": 0, "feedback": ""}
+        section_score = evaluation_result["score"]
+        # parse_evaluation_response returns a message instead of a number when the score is missing.
+        section_score = section_score if isinstance(section_score, float) else 0
+        if warnings:
+            logger.info(f"💡 {section_name} candidate has local check warnings: {warnings}")
+            section_score = max(section_score - LOCAL_CHECK_WARNING_PENALTY * len(warnings), 0)
+        candidate_span.set(score=section_score)
+        return {
+            'summary': decomposed_summary,
+            'score': section_score,
+            'feedback': evaluation_result["feedback"],
+            'problems': warnings,
+        }
+
+def is_better_candidate(candidate: Dict[str, Any], best_candidate: Dict[str, Any]) -> bool:
+    # A candidate that failed every check still beats having no summary at all.
+    return candidate['score'] > best_candidate['score'] or (bool(candidate['summary']) and not best_candidate['summary'])
+
+def format_feedback(label: str, candidate: Dict[str, Any]) -> str:
+    feedback = " ".join(part for part in [candidate['feedback'], *candidate.get('problems', [])] if part)
+    return f"{label} feedback: {feedback}" if feedback else ""
+
+async def generate_candidates_speculatively(
+    transcription: Transcription,
+    prompt: str,
+    section_name: str,
+    candidate_count: int,
+    transcript_index: Optional[TranscriptIndex] = None
+) -> Dict[str, Any]:
+    """
+    Generates `candidate_count` candidates at once and evaluates each as soon as it comes back.
+    The first candidate that clears the quality threshold wins and the pending ones are cancelled.
+    """
+    logger.info(f"💡 Generating {candidate_count} candidates for {section_name} in parallel.")
+    candidate_tasks = [
+        asyncio.create_task(generate_candidate(transcription, prompt, section_name, transcript_index))
+        for _ in range(candidate_count)
+    ]
+    best_candidate = {'summary': "", 'score': 0, 'feedback': "", 'problems': []}
+    # The local check failures of every candidate, so the refine round can avoid all of them.
+    problems = []
+    errors = []
+    try:
+        for candidate_number, next_candidate in enumerate(asyncio.as_completed(candidate_tasks), start=1):
             try:
-                evaluation_result = evaluate_section(transcription, decomposed_summary, section_name)
-                section_score = evaluation_result["score"]
-                section_feedback = evaluation_result["feedback"]
-                
-                logger.info(f"💡 {section_name} - Attempt {attempt + 1}: Section score = {section_score}")
-                feedback_history = f"Attempt {attempt + 1} feedback: {section_feedback}"
-                
-                if section_score > best_score:
-                    best_summary = decomposed_summary
-                    best_score = section_score
-                
-                if section_score >= quality_threshold:
-                    logger.info(f"💡 {section_name} meets quality standards. Moving to next section.")
-                    break
-                elif attempt < max_attempts - 1:
-                    logger.info(f"💡 {section_name} quality below threshold. Retrying... (Attempt {attempt + 2}/{max_attempts})")
-                else:
-                    logger.info(f"💡 Max attempts reached for {section_name}. Using the best version generated (score: {best_score}).")
-            
+                candidate = await next_candidate
             except Exception as e:
-                logger.error(f"🚨 Error evaluating {section_name}: {str(e)}")
+                logger.error(f"🚨 Candidate for {section_name} failed: {str(e)}")
+                errors.append(e)
+                continue
+
+            logger.info(f"💡 {section_name} - Candidate {candidate_number}/{candidate_count}: Section score = {candidate['score']}")
+            for problem in candidate['problems']:
+                if problem not in problems:
+                    problems.append(problem)
+            if is_better_candidate(candidate, best_candidate):
+                best_candidate = candidate
+            if best_candidate['score'] >= QUALITY_THRESHOLD:
+                logger.info(f"💡 {section_name} meets quality standards. Cancelling {candidate_count - candidate_number} pending candidates.")
+                break
+    finally:
+        for candidate_task in candidate_tasks:
+            candidate_task.cancel()
+        await asyncio.gather(*candidate_tasks, return_exceptions=True)
+
+    if len(errors) == candidate_count:
+        raise errors[-1]
+    return {**best_candidate, 'problems': problems}
+
+async def refine_section(
+    transcription: Transcription,
+    prompt: str,
+    section_name: str,
+    max_attempts: int,
+    best_candidate: Dict[str, Any],
+    transcript_index: Optional[TranscriptIndex] = None
+) -> Dict[str, Any]:
+    """Generates one candidate at a time, feeding the evaluator's feedback and local check failures into the next attempt."""
+    feedback_history = format_feedback("Previous candidate", best_candidate)
+
+    for attempt in range(max_attempts):
+        full_prompt = prompt + f"\n\nPrevious feedback:\n{feedback_history}"
+        logger.info(
+            f"💡 Prompt for {section_name} - Attempt {attempt + 1}",
+            extra={"prompt_chars": len(full_prompt), "feedback": truncate_payload(feedback_history)}
+        )
+        candidate = await generate_candidate(transcription, full_prompt, section_name, transcript_index)
+        section_score = candidate['score']
+
+        logger.info(f"💡 {section_name} - Attempt {attempt + 1}: Section score = {section_score}")
+        feedback_history = format_feedback(f"Attempt {attempt + 1}", candidate)
+
+        if is_better_candidate(candidate, best_candidate):
+            best_candidate = candidate
+
+        if section_score >= QUALITY_THRESHOLD:
+            logger.info(f"💡 {section_name} meets quality standards. Moving to next section.")
+            break
+        elif attempt < max_attempts - 1:
+            logger.info(f"💡 {section_name} quality below threshold. Retrying... (Attempt {attempt + 2}/{max_attempts})")
+        else:
+            logger.info(f"💡 Max attempts reached for {section_name}. Using the best version generated (score: {best_candidate['score']}).")
+
+    return best_candidate
+
+async def summarize_section(
+    transcription: Transcription,
+    prompt_boilerplate: str,
+    file_name: str,
+    transcript_index: Optional[TranscriptIndex] = None
+) -> Dict[str, Any]:
+    section_name = get_section_name(file_name)
+    prompt_content = read_file(os.path.join(BASE_DIR, 'prompts', file_name))
+    prompt = prompt_boilerplate + prompt_content
+
+    with span("summarize_section", section=section_name) as section_span:
+        best_candidate = {'summary': "", 'score': 0, 'feedback': "", 'problems': []}
+        remaining_attempts = MAX_ATTEMPTS
+        if summary_candidate_count > 1:
+            candidate_count = min(summary_candidate_count, MAX_ATTEMPTS)
+            best_candidate = await generate_candidates_speculatively(transcription, prompt, section_name, candidate_count, transcript_index)
+            remaining_attempts -= candidate_count
+            if best_candidate['score'] < QUALITY_THRESHOLD and remaining_attempts > 0:
+                logger.info(f"💡 No {section_name} candidate met the threshold. Refining with feedback... ({remaining_attempts} attempts left)")
+
+        if best_candidate['score'] < QUALITY_THRESHOLD and remaining_attempts > 0:
+            best_candidate = await refine_section(transcription, prompt, section_name, remaining_attempts, best_candidate, transcript_index)
+
+        section_span.set(score=best_candidate['score'])
+        return {
+            'summary': best_candidate['summary'],
+            'score': best_candidate['score'],
+        }
+
+async def condense_transcription(transcription: Transcription, prompt_tokens: int, map_round: int = 1) -> str:
+    """
+    The map step of map-reduce summarization: summarizes overlapping token-bounded windows of the transcript
+    concurrently into notes. Each section prompt is then run over the joined notes, which is the reduce step.
+    """
+    windows = split_into_token_windows(transcription, summary_window_tokens, summary_window_overlap_tokens)
+    logger.info(f"💡 Map round {map_round}: summarizing {len(windows)} transcript windows concurrently.")
+    map_prompt = read_file(os.path.join(BASE_DIR, 'prompts/map_reduce/window_notes.txt'))
+    window_notes = await asyncio.gather(*(summarize_transcription(window, map_prompt) for window in windows))
+    notes = "\n\n".join(
+        f"Notes on part {index} of {len(windows)} of the meeting:\n{window_note}"
+        for index, window_note in enumerate(window_notes, start=1)
+    )
+
+    if prompt_tokens + count_tokens(notes) > summary_single_pass_token_limit and map_round < MAX_MAP_ROUNDS:
+        return await condense_transcription(notes, prompt_tokens, map_round + 1)
+    return notes
+
+async def prepare_transcription_for_summarization(
+    transcription: Transcription,
+    prompt_tokens: int,
+    checkpoints: Optional[MeetingCheckpoints] = None
+) -> str:
+    """
+    Plans how to summarize the transcript from a local token count. Transcripts that fit the single-pass budget
+    are used as they are. Longer ones are condensed with a map step first.
+    """
+    transcript_tokens = count_tokens(transcription)
+    if prompt_tokens + transcript_tokens <= summary_single_pass_token_limit:
+        logger.info(f"💡 Transcript is {transcript_tokens} tokens. Summarizing in a single pass.")
+        return transcription
+
+    condensed_transcription = checkpoints.get("condensed_transcript") if checkpoints else None
+    if condensed_transcription is not None:
+        logger.info("💡 Using checkpointed map-reduce notes.")
+        return condensed_transcription
+
+    logger.info(f"💡 Transcript is {transcript_tokens} tokens, over the {summary_single_pass_token_limit} token budget. Using map-reduce.")
+    condensed_transcription = await condense_transcription(transcription, prompt_tokens)
+    if checkpoints:
+        await checkpoints.save("condensed_transcript", condensed_transcription)
+    return condensed_transcription
+
+async def decomposed_summarize_transcription_and_upload_to_notion(
+    transcription: Transcription,
+    toggle_id: str,
+    checkpoints: Optional[MeetingCheckpoints] = None
+) -> None:
+    prompt_boilerplate = read_file(os.path.join(BASE_DIR, 'prompts/prompt_boilerplate/context.txt'))
+    prompts_files = PROMPTS_FILES
+    semaphore = asyncio.Semaphore(summary_section_concurrency)
+
+    prompt_tokens = FEEDBACK_RESERVE_TOKENS + max(
+        count_tokens(prompt_boilerplate + read_file(os.path.join(BASE_DIR, 'prompts', file_name)))
+        for file_name in prompts_files
+    )
+    summary_source = await prepare_transcription_for_summarization(transcription, prompt_tokens, checkpoints)
+    # Quotes are always verified against the full transcript, even when sections are written from map-reduce notes.
+    transcript_index = TranscriptIndex(transcription)
+
+    async def get_section_result(file_name: str) -> Dict[str, Any]:
+        # A section that was already generated and scored on a previous run is never paid for twice.
+        section_result = checkpoints.get(f"section:{file_name}") if checkpoints else None
+        if section_result is not None:
+            logger.info(f"💡 Using checkpointed summary for {file_name} (score: {section_result['score']})")
+            return section_result
+        async with semaphore:
+            section_result = await summarize_section(summary_source, prompt_boilerplate, file_name, transcript_index)
+        if checkpoints:
+            await checkpoints.save(f"section:{file_name}", section_result)
+        return section_result
+
+    # The sections are independent, so they run concurrently. Results come back in prompt order,
+    # which keeps the Notion upload order fixed at Intro, Direct Quotes, Next Steps.
+    section_tasks = [asyncio.create_task(get_section_result(file_name)) for file_name in prompts_files]
+    try:
+        section_results = await asyncio.gather(*section_tasks)
+    except BaseException:
+        for section_task in section_tasks:
+            section_task.cancel()
+        raise
 
-        logger.info(f"💡 Appending summary chunk to summary chunks for {file_name}")
-        summary_chunks.append({
+    summary_chunks = [
+        {
             'filename': file_name,
-            'summary': best_summary,
-        })
+            'summary': section_result['summary'],
+        }
+        for file_name, section_result in zip(prompts_files, section_results)
+    ]
     
     section_mapping = {
         "intro.txt": append_intro_to_notion,
@@ -111,6 +332,9 @@ async def decomposed_summarize_transcription_and_upload_to_notion(transcription:
                 logger.info(f"✅ Successfully uploaded {file_name} summary section to Notion")
             except Exception as e:
                 logger.error(f"🚨 Failed to upload {file_name} summary section to Notion after retries: {str(e)}")
+                # The stage must not be marked complete with a section missing. Failing it rolls the Summary toggle
+                # back, and the next run rebuilds it from the checkpointed sections without regenerating them.
+                raise
         else:
             logger.warning(f"🚨 No append function defined for file: {file_name}")
     
@@ -0,0 +1,68 @@
+import functools
+import logging
+import math
+from typing import List
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# The o1 family uses the o200k_base encoding.
+TOKENIZER_ENCODING = "o200k_base"
+# tiktoken is optional and not a dependency, so this estimate is what deployments use. English averages ~4 characters
+# per token, so it overestimates on purpose and windows stay under their token limits.
+CHARS_PER_TOKEN = 3.5
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not load the {TOKENIZER_ENCODING} tokenizer, estimating tokens from characters: {str(e)}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_into_token_windows(text: str, window_tokens: int, overlap_tokens: int) -> List[str]:
+    """
+    Splits text into windows of at most `window_tokens` tokens, where consecutive windows share
+    `overlap_tokens` tokens so nothing said across a boundary is lost.
+    """
+    stride_tokens = max(window_tokens - overlap_tokens, 1)
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return [
+            encoding.decode(tokens[start:start + window_tokens])
+            for start in range(0, max(len(tokens) - overlap_tokens, 1), stride_tokens)
+        ]
+
+    window_chars = int(window_tokens * CHARS_PER_TOKEN)
+    overlap_chars = int(overlap_tokens * CHARS_PER_TOKEN)
+    windows = []
+    start = 0
+    while start < len(text):
+        end = min(start + window_chars, len(text))
+        if end < len(text):
+            # Don't cut a word in half.
+            boundary = text.rfind(' ', start + 1, end)
+            if boundary > start:
+                end = boundary
+        windows.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        next_start = text.find(' ', end - overlap_chars, end)
+        start = next_start + 1 if next_start > start else end
+    return windows
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from app.lib.Env import tracing_enabled, meeting_timelines_enabled
+from app.lib.Storage import STORAGE_DIR
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_DIR = os.path.join(STORAGE_DIR, "timelines")
+METRIC_PREFIX = "meeting_agent"
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Numeric span attributes that are also summed into a `<prefix>_<attribute>_total{stage=...}` counter.
+COUNTED_ATTRIBUTES = ("bytes", "prompt_tokens", "completion_tokens", "attempts")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{name}="{escape_label_value(value)}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    """
+    Counters and histograms kept in process memory, rendered in the Prometheus text format.
+    Labels are kept to low-cardinality values like stage names and status codes. Per-meeting detail
+    belongs in the timeline instead.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        # Per label set: a count per bucket, then the sum and the total count.
+        self.histograms: Dict[str, Dict[Labels, List[float]]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = [0.0] * (len(DURATION_BUCKETS) + 2)
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for name, series in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series.items():
+                for bound, count in zip(DURATION_BUCKETS, histogram):
+                    bucket_labels = format_labels(labels, 'le="%g"' % bound)
+                    lines.append(f"{name}_bucket{bucket_labels} {count:g}")
+                bucket_labels = format_labels(labels, 'le="+Inf"')
+                lines.append(f"{name}_bucket{bucket_labels} {histogram[-1]:g}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram[-2]:g}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MeetingTimeline:
+    """Every span recorded while processing one meeting, with offsets from the start of the meeting."""
+
+    def __init__(self, meeting_id: str):
+        self.meeting_id = meeting_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, started_at: float, duration: float, attributes: Dict[str, Any], error: Optional[str]) -> None:
+        self.spans.append({
+            "name": name,
+            "offset_seconds": round(started_at - self.start, 4),
+            "duration_seconds": round(duration, 4),
+            "attributes": attributes,
+            "error": error,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "meeting_id": self.meeting_id,
+            "started_at": self.started_at,
+            "duration_seconds": round(time.perf_counter() - self.start, 4),
+            "spans": sorted(self.spans, key=lambda span: span["offset_seconds"]),
+        }
+
+
+current_timeline: ContextVar[Optional[MeetingTimeline]] = ContextVar("current_timeline", default=None)
+
+
+class Span:
+    """
+    Times a stage and records it in the metrics and, while a meeting is being processed, in its timeline.
+    Use as `with span("ffmpeg") as ffmpeg_span:` and attach attributes with `ffmpeg_span.set(bytes=...)`.
+    """
+    __slots__ = ("name", "attributes", "started_at")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = 0.0
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        duration = time.perf_counter() - self.started_at
+        metrics.observe(f"{METRIC_PREFIX}_stage_duration_seconds", duration, stage=self.name)
+        error = None
+        # GeneratorExit only means whoever was consuming a traced generator stopped early.
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            error = "cancelled" if issubclass(exc_type, asyncio.CancelledError) else exc_type.__name__
+            metrics.inc(f"{METRIC_PREFIX}_stage_errors_total", stage=self.name, error=error)
+        for attribute in COUNTED_ATTRIBUTES:
+            value = self.attributes.get(attribute)
+            if isinstance(value, (int, float)):
+                metrics.inc(f"{METRIC_PREFIX}_{attribute}_total", value, stage=self.name)
+        status_code = self.attributes.get("status_code")
+        if status_code is not None:
+            metrics.inc(f"{METRIC_PREFIX}_http_responses_total", stage=self.name, status=str(status_code))
+
+        timeline = current_timeline.get()
+        if timeline is not None:
+            timeline.add(self.name, self.started_at, duration, self.attributes, error)
+        return False
+
+
+class NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        return False
+
+
+NOOP_SPAN = NoopSpan()
+
+def span(name: str, **attributes: Any) -> Union[Span, NoopSpan]:
+    """Starts a span. With TRACING_ENABLED=false this returns a shared no-op, so call sites cost next to nothing."""
+    if not tracing_enabled:
+        return NOOP_SPAN
+    return Span(name, attributes)
+
+def get_timeline_path(meeting_id: str) -> str:
+    return os.path.join(TIMELINE_DIR, f"{meeting_id}.json")
+
+def write_timeline(timeline: MeetingTimeline) -> None:
+    os.makedirs(TIMELINE_DIR, exist_ok=True)
+    with open(get_timeline_path(timeline.meeting_id), "w") as timeline_file:
+        json.dump(timeline.to_dict(), timeline_file, indent=2, default=str)
+
+@asynccontextmanager
+async def meeting_timeline(meeting_id: str) -> AsyncIterator[Optional[MeetingTimeline]]:
+    """
+    Collects the spans of everything run inside the block, including tasks it spawns, into a JSON timeline
+    at storage/timelines/<meeting id>.json. Does nothing unless MEETING_TIMELINES_ENABLED is set.
+    """
+    if not (tracing_enabled and meeting_timelines_enabled):
+        yield None
+        return
+    timeline = MeetingTimeline(meeting_id)
+    token = current_timeline.set(timeline)
+    try:
+        yield timeline
+    finally:
+        current_timeline.reset(token)
+        try:
+            await asyncio.to_thread(write_timeline, timeline)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not write the timeline for meeting {meeting_id}: {str(e)}")
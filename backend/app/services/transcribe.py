@@ -1,87 +1,221 @@
-from app.lib.Env import open_ai_api_key
-from fastapi import File, UploadFile, HTTPException
+from app.lib.Env import (
+    audio_segment_seconds,
+    audio_extraction_profile,
+    audio_trim_silence
+)
+from fastapi import HTTPException
 import os
-import uuid
-from openai import OpenAI
 import asyncio
 import aiofiles
 import tempfile
 import logging
-from typing import AsyncGenerator
+from collections import deque
+from app.services.openai_client import create_transcription
+from app.services.stage_limits import stage_limit
+from app.services.tracing import span
+from app.services.transcription_cache import (
+    cache_transcription,
+    get_cached_transcription,
+    get_segment_cache_key
+)
+from typing import AsyncGenerator, AsyncIterator, Deque, List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
-client = OpenAI(api_key=open_ai_api_key)
 
-async def extract_audio_stream(video_path: str) -> AsyncGenerator[bytes, None]:
-    command = [
-        'ffmpeg', '-i', video_path, '-vn', '-acodec', 'libmp3lame', '-b:a', '64k',
-        '-f', 'mp3', 'pipe:1'
+# Whisper downsamples everything to 16 kHz mono, so the speech profiles drop nothing it would have used.
+AUDIO_EXTRACTION_PROFILES = {
+    "default": {
+        "codec_args": ['-acodec', 'libmp3lame', '-b:a', '64k'],
+        "extension": "mp3",
+        "mime_type": "audio/mpeg",
+    },
+    "speech_mp3": {
+        "codec_args": ['-ac', '1', '-ar', '16000', '-acodec', 'libmp3lame', '-b:a', '24k'],
+        "extension": "mp3",
+        "mime_type": "audio/mpeg",
+    },
+    "speech_opus": {
+        "codec_args": ['-ac', '1', '-ar', '16000', '-acodec', 'libopus', '-b:a', '16k', '-application', 'voip'],
+        "extension": "ogg",
+        "mime_type": "audio/ogg",
+    },
+}
+
+# Cuts leading dead air, and shortens any pause longer than 3 seconds down to 1 second.
+SILENCE_TRIM_FILTER = (
+    "silenceremove=start_periods=1:start_duration=1:start_threshold=-50dB"
+    ":stop_periods=-1:stop_duration=3:stop_threshold=-50dB:stop_silence=1"
+)
+
+class AudioExtractionError(RuntimeError):
+    pass
+
+def build_extraction_command(
+    input_path: str,
+    segment_dir: str,
+    profile_name: str = audio_extraction_profile,
+    trim_silence: bool = audio_trim_silence
+) -> List[str]:
+    profile = AUDIO_EXTRACTION_PROFILES[profile_name]
+    command = ['ffmpeg', '-hide_banner', '-i', input_path, '-vn']
+    if trim_silence:
+        command += ['-af', SILENCE_TRIM_FILTER]
+    return command + profile["codec_args"] + [
+        '-f', 'segment', '-segment_time', str(audio_segment_seconds), '-reset_timestamps', '1',
+        # ffmpeg prints each segment's filename here once the segment is complete.
+        '-segment_list', 'pipe:1', '-segment_list_type', 'flat',
+        os.path.join(segment_dir, f"segment_%05d.{profile['extension']}")
     ]
-    process = await asyncio.create_subprocess_exec(
-        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-    )
-    
-    while True:
-        chunk = await process.stdout.read(1024 * 1024)  # Read 1MB at a time
-        if not chunk:
-            break
-        yield chunk
-    
-    await process.wait()
-    if process.returncode != 0:
-        stderr = await process.stderr.read()
-        logger.error(f"🚨 Error extracting audio: {stderr.decode()}")
-        raise RuntimeError("Failed to extract audio from video")
-
-async def transcribe_stream(audio_stream: AsyncGenerator[bytes, None]) -> AsyncGenerator[str, None]:
-    buffer = b""
-    chunk_size = 10 * 1024 * 1024  # 10MB chunks
-    
-    async for chunk in audio_stream:
-        buffer += chunk
-        while len(buffer) >= chunk_size:
-            chunk_to_transcribe, buffer = buffer[:chunk_size], buffer[chunk_size:]
-            transcription = await asyncio.to_thread(
-                client.audio.transcriptions.create,
-                model="whisper-1",
-                file=("chunk.mp3", chunk_to_transcribe, "audio/mpeg"),
-                response_format="text"
+
+async def feed_process_stdin(process: asyncio.subprocess.Process, video_stream: AsyncIterator[bytes]) -> None:
+    stdin_open = True
+    try:
+        async for chunk in video_stream:
+            if not stdin_open:
+                continue
+            try:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffmpeg gave up on the input. Keep draining the download so any spool file behind it still completes.
+                stdin_open = False
+    finally:
+        if stdin_open:
+            process.stdin.close()
+
+async def extract_audio_segments(video_source: Union[str, AsyncIterator[bytes]], segment_dir: str) -> AsyncGenerator[str, None]:
+    """
+    Extracts the audio track into segments of `audio_segment_seconds` each, encoded with the configured
+    extraction profile. ffmpeg's segment muxer makes every cut land on a frame boundary.
+    Segment paths are yielded as soon as ffmpeg closes each file.
+
+    :param video_source: Either a path to a video file, or an async byte stream that is piped into ffmpeg's stdin
+        so decoding starts while the video is still downloading.
+    :param segment_dir: Directory the segments are written to.
+    """
+    piped = not isinstance(video_source, str)
+    command = build_extraction_command('pipe:0' if piped else video_source, segment_dir)
+    segments = 0
+    with span("ffmpeg") as ffmpeg_span:
+        # Every meeting shares the same CPU slots, so concurrent meetings queue here instead of oversubscribing the cores.
+        async with stage_limit("ffmpeg"):
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.PIPE if piped else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
-            yield transcription.strip()
-    
-    if buffer:
-        transcription = await asyncio.to_thread(
-            client.audio.transcriptions.create,
-            model="whisper-1",
-            file=("chunk.mp3", buffer, "audio/mpeg"),
-            response_format="text"
+            # Drain stderr concurrently, otherwise a chatty ffmpeg can fill the pipe and deadlock.
+            stderr_task = asyncio.create_task(process.stderr.read())
+            feeder_task = asyncio.create_task(feed_process_stdin(process, video_source)) if piped else None
+
+            try:
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+                    segment_name = line.decode().strip()
+                    if segment_name:
+                        segments += 1
+                        ffmpeg_span.set(segments=segments)
+                        yield os.path.join(segment_dir, os.path.basename(segment_name))
+
+                if feeder_task:
+                    await feeder_task
+                await process.wait()
+            finally:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                if feeder_task and not feeder_task.done():
+                    feeder_task.cancel()
+                stderr = await stderr_task
+
+    if process.returncode != 0:
+        logger.error(f"🚨 Error extracting audio: {stderr.decode(errors='replace')}")
+        raise AudioExtractionError("Failed to extract audio from video")
+
+async def transcribe_segment(segment_path: str) -> str:
+    segment_name = os.path.basename(segment_path)
+    with span("whisper_segment", segment=segment_name) as segment_span:
+        async with aiofiles.open(segment_path, "rb") as segment_file:
+            audio = await segment_file.read()
+        segment_span.set(bytes=len(audio))
+
+        # Segments are content addressed, so a rerun of the same recording only pays for segments it never finished.
+        cache_key = get_segment_cache_key(audio)
+        cached_transcription = await get_cached_transcription(cache_key)
+        if cached_transcription is not None:
+            segment_span.set(cached=True)
+            logger.info(f"💡 Using cached transcription for {segment_name}.")
+            return cached_transcription
+
+        transcription = await create_transcription(
+            segment_name,
+            audio,
+            AUDIO_EXTRACTION_PROFILES[audio_extraction_profile]["mime_type"]
         )
-        yield transcription.strip()
+        logger.info(f"💡 Transcribed {segment_name}.")
+        transcription = transcription.strip()
+        await cache_transcription(cache_key, transcription)
+        return transcription
+
+async def transcribe_stream(segment_paths: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """
+    Transcribes segments concurrently as ffmpeg produces them. Whisper requests are limited process-wide
+    by the "whisper" stage, so segments from concurrent meetings share the same slots.
+    Transcriptions are yielded in segment order regardless of which request finishes first.
+    """
+    pending: Deque[asyncio.Task] = deque()
 
-async def transcribe(file: UploadFile = File(...)) -> str:
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            temp_path = temp_file.name
-            async with aiofiles.open(temp_path, "wb") as buffer:
-                while content := await file.read(1024 * 1024):  # Read in 1MB chunks
-                    await buffer.write(content)
-            logger.info(f"💡 File {file.filename} saved to {temp_path}.")
-
-        audio_stream = extract_audio_stream(temp_path)
-        transcription_stream = transcribe_stream(audio_stream)
-        
+        async for segment_path in segment_paths:
+            pending.append(asyncio.create_task(transcribe_segment(segment_path)))
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+async def transcribe_audio_source(video_source: Union[str, AsyncIterator[bytes]]) -> List[str]:
+    with tempfile.TemporaryDirectory(prefix="segments_") as segment_dir:
+        segment_paths = extract_audio_segments(video_source, segment_dir)
+        transcription_stream = transcribe_stream(segment_paths)
+
         full_transcription = []
         async for transcription_part in transcription_stream:
             full_transcription.append(transcription_part)
+        return full_transcription
+
+async def transcribe(video_path: str, video_stream: Optional[AsyncIterator[bytes]] = None, cache_key: Optional[str] = None) -> str:
+    """
+    Transcribes the video at `video_path`, and caches the result under `cache_key` when one is given.
+
+    When `video_stream` is given, it is piped into ffmpeg while it downloads and is expected to be spooling
+    to `video_path` at the same time. MP4s without a leading moov atom cannot be demuxed from a pipe,
+    so in that case we fall back to the completed spool file.
+    """
+    try:
+        if video_stream is not None:
+            try:
+                full_transcription = await transcribe_audio_source(video_stream)
+            except AudioExtractionError:
+                logger.warning("⚠️ Could not extract audio while streaming. Falling back to the spooled video file.")
+                full_transcription = await transcribe_audio_source(video_path)
+        else:
+            full_transcription = await transcribe_audio_source(video_path)
         
-        return " ".join(full_transcription)
+        transcription = " ".join(full_transcription)
+        if cache_key:
+            await cache_transcription(cache_key, transcription)
+        return transcription
 
     except Exception as e:
         logger.error(f"🚨 Error in transcription process: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if 'temp_path' in locals():
-            os.unlink(temp_path)
-            logger.info("Temporary file cleaned up.")
\ No newline at end of file
@@ -0,0 +1,44 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+from app.lib.Env import transcription_cache_max_bytes
+from app.lib.Storage import SqliteLruCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = "transcription_cache.sqlite3"
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_source_cache_key(url: str, fingerprint: str) -> str:
+    """Key for a whole recording, identified by its normalized URL plus an ETag-style fingerprint."""
+    normalized_url = url.strip().rstrip('/')
+    return "source:" + hash_bytes(f"{normalized_url}|{fingerprint}".encode())
+
+
+def get_segment_cache_key(audio: bytes) -> str:
+    """Key for one extracted audio segment, addressed by its content."""
+    return "segment:" + hash_bytes(audio)
+
+
+transcription_cache = SqliteLruCache(CACHE_FILE_NAME, transcription_cache_max_bytes)
+
+
+async def get_cached_transcription(key: str) -> Optional[str]:
+    try:
+        return await asyncio.to_thread(transcription_cache.get, key)
+    except Exception as e:
+        # The cache is an optimization. Never fail a meeting because of it.
+        logger.warning(f"⚠️ Transcription cache read failed: {str(e)}")
+        return None
+
+
+async def cache_transcription(key: str, content: str) -> None:
+    try:
+        await asyncio.to_thread(transcription_cache.put, key, content)
+    except Exception as e:
+        logger.warning(f"⚠️ Transcription cache write failed: {str(e)}")
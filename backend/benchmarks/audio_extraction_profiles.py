@@ -0,0 +1,90 @@
+"""
+Compares the audio extraction profiles on real recordings.
+
+For every video and every profile (with and without silence trimming) this reports the bytes that would be
+uploaded to Whisper, the number of segments, and how long ffmpeg took. Pass --transcribe to also time the
+Whisper calls, which costs real API usage.
+
+Usage, from the backend directory:
+    python -m benchmarks.audio_extraction_profiles path/to/meeting.mp4 [more.mp4 ...] [--transcribe] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+from app.services.openai_client import create_transcription
+from app.services.transcribe import AUDIO_EXTRACTION_PROFILES, build_extraction_command
+
+
+async def transcribe_segment_uncached(segment_path: str, mime_type: str) -> str:
+    # Straight to Whisper. The production path would read and fill the transcription cache,
+    # which turns a second run into cache hits and fills the cache with benchmark audio.
+    with open(segment_path, "rb") as segment_file:
+        audio = segment_file.read()
+    return await create_transcription(os.path.basename(segment_path), audio, mime_type)
+
+
+async def run_profile(video_path: str, profile_name: str, trim_silence: bool, transcribe: bool) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="benchmark_segments_") as segment_dir:
+        command = build_extraction_command(video_path, segment_dir, profile_name, trim_silence)
+        started_at = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        extract_seconds = time.perf_counter() - started_at
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed for {profile_name}: {stderr.decode(errors='replace')}")
+
+        segment_paths = [os.path.join(segment_dir, name) for name in stdout.decode().split()]
+        result = {
+            "video": os.path.basename(video_path),
+            "profile": profile_name,
+            "trim_silence": trim_silence,
+            "segments": len(segment_paths),
+            "audio_bytes": sum(os.path.getsize(path) for path in segment_paths),
+            "extract_seconds": round(extract_seconds, 2),
+        }
+        if transcribe:
+            started_at = time.perf_counter()
+            mime_type = AUDIO_EXTRACTION_PROFILES[profile_name]["mime_type"]
+            await asyncio.gather(*(transcribe_segment_uncached(path, mime_type) for path in segment_paths))
+            result["transcribe_seconds"] = round(time.perf_counter() - started_at, 2)
+        return result
+
+
+async def run_benchmark(video_paths: List[str], transcribe: bool) -> List[Dict]:
+    results = []
+    for video_path in video_paths:
+        for profile_name in AUDIO_EXTRACTION_PROFILES:
+            for trim_silence in (False, True):
+                results.append(await run_profile(video_path, profile_name, trim_silence, transcribe))
+    return results
+
+
+def print_table(results: List[Dict]) -> None:
+    columns = ["video", "profile", "trim_silence", "segments", "audio_bytes", "extract_seconds", "transcribe_seconds"]
+    columns = [column for column in columns if any(column in result for result in results)]
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result.get(column, "")) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--transcribe", action="store_true", help="Also time the Whisper calls (uses the OpenAI API).")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON instead of a table.")
+    args = parser.parse_args()
+
+    benchmark_results = asyncio.run(run_benchmark(args.videos, args.transcribe))
+    if args.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        print_table(benchmark_results)
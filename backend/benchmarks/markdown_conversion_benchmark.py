@@ -0,0 +1,287 @@
+"""
+Micro-benchmark for the markdown -> Notion blocks converter.
+
+Times app/services/parse_markdown_to_notion_blocks.py against a verbatim copy of the converter it replaced, on the
+gold standard summaries and on synthetic content with lists and oversized paragraphs. For each it also counts
+the blocks and rich text objects produced, and how many of them Notion would reject: text objects over
+2000 characters, or blocks with more than 100 rich text objects.
+
+Usage, from the backend directory:
+    python -m benchmarks.markdown_conversion_benchmark [--number 200] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import timeit
+from typing import Callable, Dict, List
+from app.lib.Strings import utf16_length
+from app.services.parse_markdown_to_notion_blocks import (
+    NOTION_MAX_RICH_TEXT_ITEMS,
+    NOTION_MAX_TEXT_LENGTH,
+    convert_content_to_blocks
+)
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GOLD_STANDARD_DIR = os.path.join(BASE_DIR, 'gold_standard_evals')
+GOLD_STANDARD_SUMMARIES = ["gold_standard_intro.txt", "gold_standard_direct_quotes.txt", "gold_standard_next_actions.txt"]
+
+
+# The converter as it was before the single-pass rewrite, kept verbatim so the comparison stays honest.
+def legacy_parse_bold(text):
+    """
+    Parses bold markdown-like directives in text.
+    
+    :param text: A string containing the text to parse.
+    :return: A list of rich text objects with bold annotations where applicable.
+    """
+    rich_text = []
+    
+    # Regular expression to identify bold text
+    bold_pattern = re.compile(r'\*\*([^*]+)\*\*')
+    
+    parts = bold_pattern.split(text)
+    i = 0
+    while i < len(parts):
+        if i + 1 < len(parts):
+            # Regular text before bold
+            regular_text = parts[i]
+            if regular_text:
+                rich_text.append({
+                    "type": "text",
+                    "text": {
+                        "content": regular_text
+                    }
+                })
+            # Bold text
+            bold_text = parts[i + 1]
+            rich_text.append({
+                "type": "text",
+                "text": {
+                    "content": bold_text
+                },
+                "annotations": {
+                    "bold": True
+                }
+            })
+            i += 2
+        else:
+            # Remaining text without bold
+            remaining_text = parts[i]
+            if remaining_text:
+                rich_text.append({
+                    "type": "text",
+                    "text": {
+                        "content": remaining_text
+                    }
+                })
+            i += 1
+    
+    return rich_text
+
+def legacy_parse_rich_text(text):
+    """
+    Parses a line of text and converts markdown-like directives into Notion's rich text format.
+    
+    :param text: A string containing the text to parse.
+    :return: A list of rich text objects compatible with Notion API.
+    """
+    rich_text = []
+    
+    # Regular expressions for different markdown-like patterns
+    link_pattern = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+    # bold_pattern = re.compile(r'\*\*([^*]+)\*\*')
+    
+    # Split the text into parts based on links
+    parts = link_pattern.split(text)
+    i = 0
+    while i < len(parts):
+        if i + 2 < len(parts):
+            # Text before link
+            pre_link = parts[i]
+            if pre_link:
+                rich_text.extend(legacy_parse_bold(pre_link))
+            # Link text and URL
+            link_text = parts[i + 1]
+            link_url = parts[i + 2]
+            rich_text.append({
+                "type": "text",
+                "text": {
+                    "content": link_text,
+                    "link": {
+                        "url": link_url
+                    }
+                }
+            })
+            i += 3
+        else:
+            # Remaining text without links
+            remaining_text = parts[i]
+            if remaining_text:
+                rich_text.extend(legacy_parse_bold(remaining_text))
+            i += 1
+    
+    return rich_text
+
+def legacy_convert_line_to_block(line):
+    """
+    Converts a single line of text with markdown-like directives into a Notion block.
+    
+    :param line: A string containing the line to convert.
+    :return: A Notion block object or None if the line is empty.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    
+    # Section Titles
+    if line.startswith("## "):
+        title = line[3:].strip()
+        return {
+            "object": "block",
+            "type": "heading_2",
+            "heading_2": {
+                "rich_text": [
+                    {
+                        "type": "text",
+                        "text": {
+                            "content": title
+                        },
+                        "annotations": {
+                            "bold": True
+                        }
+                    }
+                ]
+            }
+        }
+    
+    # Subsection Titles
+    elif line.startswith("**") and line.endswith("**"):
+        sub_title = line[2:-2].strip()
+        return {
+            "object": "block",
+            "type": "heading_3",
+            "heading_3": {
+                "rich_text": [
+                    {
+                        "type": "text",
+                        "text": {
+                            "content": sub_title
+                        },
+                        "annotations": {
+                            "bold": True
+                        }
+                    }
+                ]
+            }
+        }
+    
+    # Direct Quotes
+    elif line.startswith('"') and line.endswith('"'):
+        quote_text = line[1:-1].strip()
+        return {
+            "object": "block",
+            "type": "quote",
+            "quote": {
+                "rich_text": legacy_parse_rich_text(quote_text)
+            }
+        }
+    
+    # Regular Paragraph
+    else:
+        return {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {
+                "rich_text": legacy_parse_rich_text(line)
+            }
+        }
+
+def legacy_convert_content_to_blocks(content):
+    """
+    Converts multi-line content into a list of Notion blocks.
+    
+    :param content: A string containing the multi-line content.
+    :return: A list of Notion block objects.
+    """
+    blocks = []
+    lines = content.split('\n')
+    for line in lines:
+        block = legacy_convert_line_to_block(line)
+        if block:
+            blocks.append(block)
+    return blocks
+
+
+def build_synthetic_inputs() -> Dict[str, str]:
+    list_items = "\n".join(
+        f"- **Owner {i}** follows up on [the *spec* doc](https://example.com/{i}) and runs `make check`" for i in range(200)
+    )
+    numbered_items = "\n".join(f"{i}. Ship _milestone_ {i} before the review" for i in range(1, 201))
+    long_paragraph = " ".join(f"Sentence {i} mentions **a decision** and a 🚀 launch." for i in range(400))
+    return {
+        "synthetic_lists": "## Next Actions\n\n" + list_items + "\n" + numbered_items,
+        "synthetic_long_paragraph": "## Intro\n\n" + long_paragraph,
+    }
+
+
+def load_inputs() -> Dict[str, str]:
+    inputs = {}
+    for file_name in GOLD_STANDARD_SUMMARIES:
+        with open(os.path.join(GOLD_STANDARD_DIR, file_name), 'r', encoding='utf-8') as file:
+            inputs[file_name] = file.read()
+    inputs.update(build_synthetic_inputs())
+    return inputs
+
+
+def describe_blocks(blocks: List[Dict]) -> Dict:
+    rich_text_lists = [block[block["type"]].get("rich_text", []) for block in blocks]
+    return {
+        "blocks": len(blocks),
+        "block_types": sorted({block["type"] for block in blocks}),
+        "rich_text_objects": sum(len(rich_text) for rich_text in rich_text_lists),
+        "oversized_text_objects": sum(
+            1 for rich_text in rich_text_lists for item in rich_text
+            if utf16_length(item["text"]["content"]) > NOTION_MAX_TEXT_LENGTH
+        ),
+        "oversized_blocks": sum(1 for rich_text in rich_text_lists if len(rich_text) > NOTION_MAX_RICH_TEXT_ITEMS),
+    }
+
+
+def time_converter(converter: Callable[[str], List[Dict]], content: str, number: int) -> float:
+    """Best of five runs, in microseconds per conversion."""
+    return min(timeit.repeat(lambda: converter(content), number=number, repeat=5)) / number * 1_000_000
+
+
+def run_benchmark(number: int) -> List[Dict]:
+    results = []
+    for name, content in load_inputs().items():
+        for converter_name, converter in (("legacy", legacy_convert_content_to_blocks), ("single_pass", convert_content_to_blocks)):
+            results.append({
+                "input": name,
+                "converter": converter_name,
+                "characters": len(content),
+                "microseconds": round(time_converter(converter, content, number), 1),
+                **describe_blocks(converter(content)),
+            })
+    return results
+
+
+def print_table(results: List[Dict]) -> None:
+    columns = ["input", "converter", "characters", "microseconds", "blocks", "rich_text_objects", "oversized_text_objects", "oversized_blocks", "block_types"]
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result[column]) if column != "block_types" else ",".join(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200, help="Conversions per timing run.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON instead of a table.")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmark(args.number)
+    if args.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        print_table(benchmark_results)
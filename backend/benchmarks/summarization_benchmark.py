@@ -0,0 +1,220 @@
+"""
+Offline benchmark for the summarize -> evaluate -> upload loop.
+
+Runs decomposed_summarize_transcription_and_upload_to_notion against the gold standard transcript and against
+synthetic longer transcripts made by repeating it. OpenAI is replaced by a local stand-in with configurable latency
+and scripted evaluation scores, and Notion by a fake that records every request. Nothing leaves the machine.
+
+The report is JSON so it can be diffed between commits to catch performance regressions in prompt or loop changes.
+
+Usage, from the backend directory:
+    python -m benchmarks.summarization_benchmark [--latency 0.05] [--scores 0.6,0.85] [--repeat 1,4,12] [--output report.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+import types
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+# Keep the benchmark's caches and job store away from the real ones, and start every run cold.
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="summarization_benchmark_")
+
+from app.services import summarize
+from app.services.notion_client import set_notion_client
+from app.services.openai_client import set_openai_client
+from app.services.token_budget import count_tokens
+
+original_condense_transcription = summarize.condense_transcription
+original_summarize_section = summarize.summarize_section
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GOLD_STANDARD_TRANSCRIPT = os.path.join(BASE_DIR, 'gold_standard_evals', 'gold_standard_transcript.txt')
+SECTION_MARKERS = {
+    "Intro": "## Intro",
+    "Direct Quotes": "## Direct Quotes",
+    "Next Actions": "## Next Actions",
+}
+
+
+class BenchmarkStats:
+    def __init__(self):
+        self.llm_calls = defaultdict(int)
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.attempts = defaultdict(int)
+        self.evaluations = defaultdict(int)
+        self.notion_requests = 0
+        self.notion_blocks = 0
+        self.stage_seconds = defaultdict(float)
+
+
+class FakeChatCompletions:
+    """Answers like o1-mini would, after `latency` seconds, with evaluation scores taken from `scores` in order."""
+
+    def __init__(self, stats: BenchmarkStats, latency: float, scores: List[float], transcription: str):
+        self.stats = stats
+        self.latency = latency
+        self.scores = scores
+        self.transcript_words = transcription.split()
+
+    async def create(self, model: str, messages: List[Dict[str, str]]):
+        prompt = messages[-1]["content"]
+        await asyncio.sleep(self.latency)
+
+        if "Evaluate the following" in prompt:
+            section_name = re.search(r"Evaluate the following (.+?) section", prompt).group(1)
+            score = self.scores[min(self.stats.evaluations[section_name], len(self.scores) - 1)]
+            self.stats.evaluations[section_name] += 1
+            self.stats.llm_calls["evaluate"] += 1
+            content = f"Score: {score}\nFeedback: Scripted feedback for attempt {self.stats.evaluations[section_name]}."
+        elif "Transcript part:" in prompt:
+            self.stats.llm_calls["map"] += 1
+            transcript_part = prompt.split("Transcript part:", 1)[1]
+            content = "Notes: " + " ".join(transcript_part.split()[:300])
+        else:
+            section_name = self.get_section_name(prompt)
+            self.stats.attempts[section_name] += 1
+            self.stats.llm_calls["generate"] += 1
+            content = self.write_section(section_name, self.stats.attempts[section_name])
+
+        usage = types.SimpleNamespace(prompt_tokens=count_tokens(prompt), completion_tokens=count_tokens(content))
+        self.stats.prompt_tokens += usage.prompt_tokens
+        self.stats.completion_tokens += usage.completion_tokens
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+    @staticmethod
+    def get_section_name(prompt: str) -> str:
+        # Every section prompt's example starts with its heading.
+        positions = {name: prompt.find(marker) for name, marker in SECTION_MARKERS.items() if marker in prompt}
+        return min(positions, key=positions.get) if positions else "Unknown"
+
+    def write_section(self, section_name: str, attempt: int) -> str:
+        # Every attempt writes different text from the transcript, so the evaluation cache never hides a call,
+        # and the quotes are real so the local checks let the candidate through to evaluation.
+        words = self.transcript_words[attempt * 100:] or self.transcript_words
+        if section_name == "Direct Quotes":
+            quotes = [" ".join(words[start:start + 20]) for start in (0, 30, 60)]
+            return "## Direct Quotes\n" + "\n".join(f'"{quote}"' for quote in quotes)
+        if section_name == "Next Actions":
+            return "## Next Actions\n\n**Follow Up**\n" + " ".join(words[:60])
+        return "## Intro\n" + " ".join(words[:80])
+
+
+class FakeNotionResponse:
+    def __init__(self, data: Dict):
+        self.status_code = 200
+        self.data = data
+        self.text = json.dumps(data)
+
+    def json(self) -> Dict:
+        return self.data
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeNotionClient:
+    """Accepts every append after `latency` seconds and hands out made-up block ids."""
+
+    def __init__(self, stats: BenchmarkStats, latency: float):
+        self.stats = stats
+        self.latency = latency
+
+    async def request(self, method: str, path: str, json: Optional[Dict] = None, params: Optional[Dict] = None, idempotent: bool = True) -> FakeNotionResponse:
+        started_at = time.perf_counter()
+        await asyncio.sleep(self.latency)
+        self.stats.notion_requests += 1
+        blocks = (json or {}).get("children", [])
+        self.stats.notion_blocks += len(blocks)
+        self.stats.stage_seconds["notion_upload"] += time.perf_counter() - started_at
+        return FakeNotionResponse({"results": [{"id": f"block-{self.stats.notion_blocks - index}"} for index in range(len(blocks))]})
+
+
+def install_fakes(stats: BenchmarkStats, latency: float, scores: List[float], transcription: str) -> None:
+    chat = FakeChatCompletions(stats, latency, scores, transcription)
+    set_openai_client(types.SimpleNamespace(chat=types.SimpleNamespace(completions=chat)))
+
+    set_notion_client(FakeNotionClient(stats, latency))
+
+    async def condense_transcription(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await original_condense_transcription(*args, **kwargs)
+        finally:
+            stats.stage_seconds["map"] += time.perf_counter() - started_at
+
+    async def summarize_section(transcription, prompt_boilerplate, file_name, *args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await original_summarize_section(transcription, prompt_boilerplate, file_name, *args, **kwargs)
+        finally:
+            stats.stage_seconds[f"section:{file_name}"] += time.perf_counter() - started_at
+
+    summarize.condense_transcription = condense_transcription
+    summarize.summarize_section = summarize_section
+
+
+async def run_scenario(name: str, transcription: str, latency: float, scores: List[float]) -> Dict:
+    stats = BenchmarkStats()
+    install_fakes(stats, latency, scores, transcription)
+
+    started_at = time.perf_counter()
+    await summarize.decomposed_summarize_transcription_and_upload_to_notion(transcription, "benchmark-toggle")
+    total_seconds = time.perf_counter() - started_at
+
+    return {
+        "scenario": name,
+        "transcript_chars": len(transcription),
+        "transcript_tokens": count_tokens(transcription),
+        "attempts_per_section": dict(stats.attempts),
+        "evaluations_per_section": dict(stats.evaluations),
+        "llm_calls": dict(stats.llm_calls),
+        "prompt_tokens": stats.prompt_tokens,
+        "completion_tokens": stats.completion_tokens,
+        "notion_requests": stats.notion_requests,
+        "notion_blocks": stats.notion_blocks,
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in stats.stage_seconds.items()},
+        "total_seconds": round(total_seconds, 3),
+    }
+
+
+async def run_benchmark(latency: float, scores: List[float], repeats: List[int]) -> Dict:
+    with open(GOLD_STANDARD_TRANSCRIPT) as f:
+        gold_standard_transcript = f.read()
+
+    scenarios = []
+    for repeat in repeats:
+        name = "gold_standard" if repeat == 1 else f"gold_standard_x{repeat}"
+        scenarios.append(await run_scenario(name, " ".join([gold_standard_transcript] * repeat), latency, scores))
+    return {
+        "latency_seconds": latency,
+        "scripted_scores": scores,
+        "scenarios": scenarios,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every fake OpenAI and Notion call takes.")
+    parser.add_argument("--scores", default="0.6,0.85", help="Evaluation scores returned per section, in order. The last one repeats.")
+    parser.add_argument("--repeat", default="1,4,12", help="How many times the gold transcript is repeated for each scenario.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(
+        args.latency,
+        [float(score) for score in args.scores.split(",")],
+        [int(repeat) for repeat in args.repeat.split(",")]
+    ))
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_json + "\n")
+    else:
+        print(report_json)
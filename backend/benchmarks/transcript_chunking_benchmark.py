@@ -0,0 +1,116 @@
+"""
+Benchmark for the transcript chunker on multi-hour transcripts.
+
+Times app/services/chunk_text_with_2000_char_limit_for_notion.py against a verbatim copy of the chunker it
+replaced, on transcripts made by repeating the gold standard transcript to a given length in hours. Each
+length is also run with emoji and CJK text mixed in, since Notion measures its 2000 limit in UTF-16 code
+units. Reports total time, time to the first chunk, the number of chunks, and how many chunks Notion would reject.
+
+Usage, from the backend directory:
+    python -m benchmarks.transcript_chunking_benchmark [--hours 1,4,8] [--json]
+"""
+import argparse
+import json
+import os
+import time
+from typing import Callable, Dict, Iterable, List
+from app.lib.Strings import utf16_length
+from app.services.chunk_text_with_2000_char_limit_for_notion import chunk_text_with_2000_char_limit_for_notion
+from app.services.parse_markdown_to_notion_blocks import NOTION_MAX_TEXT_LENGTH
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+GOLD_STANDARD_TRANSCRIPT = os.path.join(BASE_DIR, 'gold_standard_evals', 'gold_standard_transcript.txt')
+# Roughly 150 spoken words per minute at about 6 characters per word, spaces included.
+CHARACTERS_PER_HOUR = 150 * 60 * 6
+NON_BMP_WORDS = ["🚀", "会议", "👍", "😀"]
+
+
+# The chunker as it was before the rewrite, kept verbatim so the comparison stays honest.
+def legacy_chunk_text_with_2000_char_limit_for_notion(text, max_length=1999):
+    """
+    Splits the input text into chunks, each with a maximum length of `max_length` characters.
+    
+    :param text: The text to be chunked.
+    :param max_length: The maximum length of each chunk.
+    :return: A list of text chunks.
+    """
+    chunks = []
+    while len(text) > max_length:
+        chunk = text[:max_length]
+        last_sentence_end = chunk.rfind('.')
+        if last_sentence_end == -1:
+            last_sentence_end = max_length
+        current_chunk = text[:last_sentence_end + 1].strip()
+        if current_chunk:
+            chunks.append(current_chunk)
+        text = text[last_sentence_end + 1:].strip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+def build_transcript(hours: float, non_bmp: bool) -> str:
+    with open(GOLD_STANDARD_TRANSCRIPT, 'r', encoding='utf-8') as file:
+        gold_standard = file.read()
+    words = gold_standard.split(" ")
+    if non_bmp:
+        words = [f"{word} {NON_BMP_WORDS[index % len(NON_BMP_WORDS)]}" if index % 5 == 0 else word for index, word in enumerate(words)]
+    base = " ".join(words)
+    target_length = int(hours * CHARACTERS_PER_HOUR)
+    return (base + " ") * (target_length // (len(base) + 1)) + base[:target_length % (len(base) + 1)]
+
+
+def run_chunker(chunker: Callable[[str], Iterable[str]], transcript: str) -> Dict:
+    started_at = time.perf_counter()
+    chunks = iter(chunker(transcript))
+    first_chunk = next(chunks, None)
+    first_chunk_seconds = time.perf_counter() - started_at
+    all_chunks = ([first_chunk] if first_chunk is not None else []) + list(chunks)
+    total_seconds = time.perf_counter() - started_at
+    lengths = [utf16_length(chunk) for chunk in all_chunks]
+    return {
+        "seconds": round(total_seconds, 4),
+        "first_chunk_seconds": round(first_chunk_seconds, 6),
+        "chunks": len(all_chunks),
+        "max_utf16_length": max(lengths, default=0),
+        "over_limit_chunks": sum(1 for length in lengths if length > NOTION_MAX_TEXT_LENGTH),
+    }
+
+
+def run_benchmark(hours_list: List[float]) -> List[Dict]:
+    results = []
+    for hours in hours_list:
+        for non_bmp in (False, True):
+            transcript = build_transcript(hours, non_bmp)
+            for chunker_name, chunker in (
+                ("legacy", legacy_chunk_text_with_2000_char_limit_for_notion),
+                ("streaming", chunk_text_with_2000_char_limit_for_notion)
+            ):
+                results.append({
+                    "hours": hours,
+                    "non_bmp": non_bmp,
+                    "characters": len(transcript),
+                    "chunker": chunker_name,
+                    **run_chunker(chunker, transcript),
+                })
+    return results
+
+
+def print_table(results: List[Dict]) -> None:
+    columns = ["hours", "non_bmp", "characters", "chunker", "seconds", "first_chunk_seconds", "chunks", "max_utf16_length", "over_limit_chunks"]
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", default="1,4,8", help="Transcript lengths to test, in hours of speech.")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON instead of a table.")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmark([float(hours) for hours in args.hours.split(",")])
+    if args.json:
+        print(json.dumps(benchmark_results, indent=2))
+    else:
+        print_table(benchmark_results)
@@ -1,21 +1,56 @@
-from app.lib.Env import environment
+from app.lib.Env import environment, meeting_poll_enabled
+from app.lib.Logging import configure_logging
 import logging
 import asyncio
-from app.api.update_notion_with_transcript_and_summary import update_notion_with_transcript_and_summary
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from app.api import api_router
+from app.api.update_notion_with_transcript_and_summary import poll_and_process_meetings, run_job_worker
+from app.services.http_client import close_http_client
+from app.services.openai_client import close_openai_client
+from app.services.notion_client import close_notion_client
+from app.services.meeting_poller import meeting_poller
+from app.services.eval_agent import prepare_gold_standard_references
+from app.services.summarize import PROMPTS_FILES, get_section_name
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 logger.info(f"💡 Running in {environment} environment")
 
+async def close_clients():
+    await close_http_client()
+    await close_openai_client()
+    await close_notion_client()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prepare_gold_standard_references(get_section_name(file_name) for file_name in PROMPTS_FILES)
+    worker_task = asyncio.create_task(run_job_worker())
+    if meeting_poll_enabled:
+        meeting_poller.start()
+    try:
+        yield
+    finally:
+        meeting_poller.shutdown()
+        worker_task.cancel()
+        await asyncio.gather(worker_task, return_exceptions=True)
+        await close_clients()
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(api_router)
+
 async def run_update_task():
     try:
         logger.info("🌺Starting Notion update task")
-        await update_notion_with_transcript_and_summary()
-        logger.info("🎬 Notion update task completed successfully")
+        prepare_gold_standard_references(get_section_name(file_name) for file_name in PROMPTS_FILES)
+        result = await poll_and_process_meetings()
+        logger.info(f"🎬 Notion update task completed successfully: {result}")
     except Exception as e:
         logger.error(f"🚨 Error in Notion update task: {str(e)}")
+    finally:
+        await close_clients()
 
 if __name__ == "__main__":
-    asyncio.run(run_update_task())
\ No newline at end of file
+    asyncio.run(run_update_task())
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Keep the job store and caches of the tests away from the real ones. Set before any app module is imported.
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="backend_tests_")
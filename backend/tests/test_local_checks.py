@@ -0,0 +1,28 @@
+import pytest
+
+from app.services.local_checks import parse_score
+
+
+@pytest.mark.parametrize("response, score", [
+    ("Score: 0.85\nFeedback: Good.", 0.85),
+    ("**Score:** .85", 0.85),
+    ("Score: 8/10", 0.8),
+    ("Score: 85%", 0.85),
+    ("Score: 8", 0.8),
+    ("Score: 75", 0.75),
+    ("Score: 100", 1.0),
+])
+def test_parse_score(response, score):
+    assert parse_score(response) == pytest.approx(score)
+
+
+@pytest.mark.parametrize("response", [
+    "Score: 250",
+    "Score: 12/10",
+    "Score: 5/0",
+    "Score: 150%",
+    "Feedback: No score here.",
+    "",
+])
+def test_parse_score_returns_none_for_a_missing_or_out_of_range_score(response):
+    assert parse_score(response) is None
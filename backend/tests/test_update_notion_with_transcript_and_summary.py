@@ -0,0 +1,94 @@
+import asyncio
+import itertools
+from typing import Dict, List, Optional
+
+from app.api import update_notion_with_transcript_and_summary as api
+from app.models import MeetingRecord
+from app.services.job_store import MeetingCheckpoints, MeetingJobStore
+from app.services.notion import append_section_to_notion
+from app.services.notion_client import set_notion_client
+
+PAGE_ID = "meeting-page"
+
+
+class FakeNotionResponse:
+    def __init__(self, data: Dict):
+        self.status_code = 200
+        self.data = data
+        self.text = str(data)
+
+    def json(self) -> Dict:
+        return self.data
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeNotionPage:
+    """Keeps the children of every block in order, and hands out block ids, like Notion would."""
+
+    def __init__(self):
+        self.children: Dict[str, List[Dict]] = {PAGE_ID: []}
+        self.block_ids = itertools.count(1)
+
+    async def request(self, method: str, path: str, json: Optional[Dict] = None, params: Optional[Dict] = None, idempotent: bool = True) -> FakeNotionResponse:
+        if method == "PATCH" and path.endswith("/children"):
+            parent_id = path.split("/")[2]
+            results = []
+            for block in json["children"]:
+                block = {**block, "id": f"block-{next(self.block_ids)}"}
+                self.children.setdefault(parent_id, []).append(block)
+                self.children[block["id"]] = []
+                results.append(block)
+            return FakeNotionResponse({"results": results})
+        if method == "DELETE":
+            block_id = path.split("/")[2]
+            for children in self.children.values():
+                children[:] = [child for child in children if child["id"] != block_id]
+            return FakeNotionResponse({})
+        return FakeNotionResponse({"properties": {"Summarized": {"checkbox": False}}})
+
+    def get_toggle_titles(self) -> List[str]:
+        return [block["toggle"]["rich_text"][0]["text"]["content"] for block in self.children[PAGE_ID]]
+
+
+def test_summary_failing_after_the_transcript_completed_is_retried_above_it(tmp_path, monkeypatch):
+    notion_page = FakeNotionPage()
+    set_notion_client(notion_page)
+    job_store = MeetingJobStore(str(tmp_path / "meeting_jobs.sqlite3"))
+    summary_attempts = []
+
+    async def summarize_and_upload(transcription, toggle_id, checkpoints):
+        summary_attempts.append(toggle_id)
+        await append_section_to_notion(toggle_id, "The intro.", "Intro")
+        if len(summary_attempts) == 1:
+            # Long enough for the transcript stage running alongside to finish first.
+            await asyncio.sleep(0.05)
+            raise RuntimeError("The LLM is down")
+
+    async def set_summarized(page_id):
+        pass
+
+    monkeypatch.setattr(api, "decomposed_summarize_transcription_and_upload_to_notion", summarize_and_upload)
+    monkeypatch.setattr(api, "set_summarized_checkbox_on_notion_page_to_true", set_summarized)
+    meeting = MeetingRecord(id=PAGE_ID, jumpshare_link="https://jmp.sh/meeting", summarized=False, last_edited_time=None)
+
+    async def run() -> None:
+        checkpoints = await MeetingCheckpoints.load(PAGE_ID, job_store)
+        await checkpoints.save("transcript", "Hello everyone, let's get started.")
+        try:
+            await api.process_meeting(meeting, job_store)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("The first run should fail")
+        assert notion_page.get_toggle_titles() == []
+        await api.process_meeting(meeting, job_store)
+
+    try:
+        asyncio.run(run())
+    finally:
+        set_notion_client(None)
+
+    assert len(summary_attempts) == 2
+    assert notion_page.get_toggle_titles() == ["Summary", "Transcript"]